@@ -1,52 +1,238 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 import nlp
 import gemini
-from functools import lru_cache
+import cache
+import content
+import metrics
+import scheduler
+import asyncio
+import json
 import os
 
 # Flask constructor looks for 'templates' and 'static' folders by default
 app = Flask(__name__, static_folder='static', static_url_path='')
 
+# --- Batch Settings ---
+# Largest number of records accepted by /triage/batch in one request
+BATCH_MAX_ITEMS = int(os.getenv('TRIAGE_BATCH_MAX_ITEMS', '100'))
+# Upper bound on explanations one batch request generates at once. All
+# requests together are also bounded by gemini.GEMINI_MAX_INFLIGHT
+BATCH_CONCURRENCY = int(os.getenv('TRIAGE_BATCH_CONCURRENCY', '8'))
+
+# Order in which batch explanations are started, most urgent first
+CATEGORY_PRIORITY = {'Emergency': 0, 'Urgent': 1, 'Routine': 2}
+
+# --- Scheduler ---
+# Admits the Gemini step in Emergency > Urgent > Routine order and sheds
+# Routine work first when saturated; see scheduler.PriorityScheduler
+triage_scheduler = scheduler.PriorityScheduler.from_env(total_limit=gemini.GEMINI_MAX_INFLIGHT)
+
+# --- Warm-up ---
+def warm_up(download_nltk_data: bool = False):
+    """
+    Optional hook that initializes the NLP tables and Gemini client ahead of
+    the first request. Nothing heavy happens at import; with gunicorn, call
+    this from a post_worker_init hook to move the cost out of request time.
+    """
+    nlp.warm_up(download=download_nltk_data)
+    gemini.warm_up()
+    content.health_tips()
+
 # --- Caching Function ---
-@lru_cache(maxsize=256)
-def get_triage_and_explanation(symptoms: str, age: int, gender: str, bmi: float, history: tuple) -> dict:
+# Shared by all workers on the host by default; see cache.create_cache
+triage_cache = cache.create_cache()
+# Concurrent misses for the same key wait on a single computation
+triage_flight = cache.SingleFlight()
+# Same for the async path, which runs on gemini's shared event loop
+triage_async_flight = cache.AsyncSingleFlight()
+
+# --- Metrics ---
+# Stage timings and counters live in metrics.py; these gauges are read when
+# /metrics is scraped
+metrics.REGISTRY.gauge(
+    'triage_scheduler_queued', 'Requests waiting for an explanation slot.', ('tier',),
+    lambda: [((tier,), s['queued']) for tier, s in triage_scheduler.stats()['tiers'].items()])
+metrics.REGISTRY.gauge(
+    'triage_scheduler_in_flight', 'Explanations currently being generated.', ('tier',),
+    lambda: [((tier,), s['in_flight']) for tier, s in triage_scheduler.stats()['tiers'].items()])
+metrics.REGISTRY.gauge(
+    'triage_cache_evictions', 'Expired or size-trimmed triage cache entries seen by this worker.', (),
+    lambda: [((), triage_cache.stats()['evictions'])])
+metrics.REGISTRY.gauge(
+    'gemini_circuit_open', '1 while the Gemini circuit breaker is refusing calls.', (),
+    lambda: [((), int(gemini._health_analyzer is not None
+                      and gemini._health_analyzer.circuit_breaker.state == gemini.CircuitBreaker.OPEN))])
+
+def classify_symptoms(symptoms: str) -> dict:
+    """Run the keyword triage, timing it as the nlp_classify stage."""
+    with metrics.timed('nlp_classify'):
+        return nlp.triage_symptoms(symptoms)
+
+def lookup_cache(key: str):
+    """Read the triage cache, timing the lookup and counting the result."""
+    with metrics.timed('cache_lookup'):
+        response_data = triage_cache.get(key)
+    metrics.cache_lookups.inc('hit' if response_data is not None else 'miss')
+    return response_data
+
+def get_triage_and_explanation(symptoms: str, age: int, gender: str, bmi: float, history: tuple,
+                                triage_result: dict = None) -> dict:
     """
     A cached function to perform the full NLP and AI analysis pipeline.
-    History must be a tuple to be hashable for the cache.
+    Requests with the same normalized symptoms, age and BMI band, gender
+    and history share one cache entry. A precomputed triage_result skips
+    the NLP step on a miss.
     """
-    print(f"--- CACHE MISS: Processing new request for age '{age}', history: '{history}', symptoms: '{symptoms[:30]}...' ---")
-    
-    # 1. NLP Analysis to get category and keywords
-    triage_result = nlp.triage_symptoms(symptoms)
+    key = cache.make_triage_key(symptoms, age, gender, bmi, history)
+    response_data = lookup_cache(key)
+    if response_data is None:
+        response_data = triage_flight.do(
+            key, lambda: compute_and_store(key, symptoms, age, gender, bmi, history, triage_result)
+        )
+    return response_data
+
+def compute_and_store(key: str, symptoms: str, age: int, gender: str, bmi: float, history: tuple,
+                      triage_result: dict = None) -> dict:
+    """
+    Fill one cache miss. The shared cache's lock makes other workers wait
+    for this result instead of making the same Gemini call.
+    """
+    token = triage_cache.acquire_lock(key)
+    try:
+        if token is None:
+            response_data = triage_cache.wait_for(key)
+        else:
+            # Another worker may have finished just before we took the lock
+            response_data = triage_cache.peek(key)
+        if response_data is None:
+            print(f"--- CACHE MISS: Processing new request for age '{age}', history: '{history}', symptoms: '{symptoms[:30]}...' ---")
+            response_data = run_triage_pipeline(symptoms, age, gender, bmi, history, triage_result)
+            # Degraded answers are not cached so the next request retries Gemini
+            if not response_data['degraded']:
+                triage_cache.set(key, response_data)
+        return response_data
+    finally:
+        if token is not None:
+            triage_cache.release_lock(key, token)
+
+def run_triage_pipeline(symptoms: str, age: int, gender: str, bmi: float, history: tuple,
+                        triage_result: dict = None) -> dict:
+    """Run the NLP and AI analysis for one request, without caching."""
+    # 1. NLP Analysis to get category and keywords, unless the caller has it
+    triage_result = triage_result or classify_symptoms(symptoms)
     
-    # 2. Prepare user profile for the Gemini AI model
-    user_profile = {
+    # 2. Generate a structured, contextual explanation from Gemini AI, once
+    # the scheduler admits this request's tier
+    with triage_scheduler.slot(triage_result['category']) as admitted:
+        if admitted:
+            explanation_data = gemini.generate_structured_explanation(
+                user_profile=make_user_profile(age, gender, bmi, history),
+                symptoms=symptoms,
+                category=triage_result['category'],
+                keywords=triage_result['keywords']
+            )
+        else:
+            metrics.fallbacks.inc('shed')
+            explanation_data = gemini.get_fallback_response(triage_result['category'], symptoms)
+
+    # 3. Combine all data into a final response object
+    return build_triage_response(triage_result, explanation_data)
+
+def make_user_profile(age: int, gender: str, bmi: float, history: tuple) -> dict:
+    """Prepare the user profile for the Gemini AI model."""
+    return {
         "age": age,
         "gender": gender,
         "bmi": bmi,
         "history": list(history) # Convert tuple back to list for the prompt
     }
-    
-    # 3. Generate a structured, contextual explanation from Gemini AI
-    explanation_data = gemini.generate_structured_explanation(
-        user_profile=user_profile,
-        symptoms=symptoms,
-        category=triage_result['category'],
-        keywords=triage_result['keywords']
-    )
 
-    # 4. Combine all data into a final response object
-    response_data = {
+def build_triage_response(triage_result: dict, explanation_data: dict) -> dict:
+    """Combine the NLP result and the explanation into the API response."""
+    return {
         "triage_category": triage_result['category'],
         "confidence": round(triage_result.get('confidence', 0.0), 2),
         "keywords": triage_result['keywords'],
-        "explanation_details": explanation_data
+        "explanation_details": explanation_data,
+        # True when Gemini was unavailable and a generic fallback was served
+        "degraded": bool(explanation_data.get('degraded', False))
     }
+
+# --- Async Pipeline ---
+# Coroutine versions of the functions above. They run on gemini's shared
+# event loop (gemini.run_async), where waiting on the model does not hold an
+# OS thread, so one worker can keep many explanations in flight. Only
+# /triage/batch uses them: under WSGI, /triage and /triage/stream hold a
+# request thread until they respond whichever path they take, so many
+# concurrent single records need more worker threads (or batching).
+
+async def get_triage_and_explanation_async(symptoms: str, age: int, gender: str, bmi: float, history: tuple,
+                                           triage_result: dict = None) -> dict:
+    """
+    Async get_triage_and_explanation, sharing its cache and keys.
+    A precomputed triage_result skips the NLP step on a miss.
+    """
+    key = cache.make_triage_key(symptoms, age, gender, bmi, history)
+    response_data = await asyncio.to_thread(lookup_cache, key)
+    if response_data is None:
+        response_data = await triage_async_flight.do(
+            key, lambda: compute_and_store_async(key, symptoms, age, gender, bmi, history, triage_result)
+        )
     return response_data
 
+async def compute_and_store_async(key: str, symptoms: str, age: int, gender: str, bmi: float, history: tuple,
+                                  triage_result: dict = None) -> dict:
+    """
+    Async compute_and_store. Cache calls can block (SQLite waits up to 5s
+    on a busy file), so they run in threads rather than on the event loop
+    that every in-flight model call shares.
+    """
+    token = await asyncio.to_thread(triage_cache.acquire_lock, key)
+    try:
+        if token is None:
+            response_data = await triage_cache.wait_for_async(key)
+        else:
+            response_data = await asyncio.to_thread(triage_cache.peek, key)
+        if response_data is None:
+            print(f"--- CACHE MISS: Processing new request for age '{age}', history: '{history}', symptoms: '{symptoms[:30]}...' ---")
+            triage_result = triage_result or classify_symptoms(symptoms)
+            async with triage_scheduler.slot_async(triage_result['category']) as admitted:
+                if admitted:
+                    explanation_data = await gemini.generate_structured_explanation_async(
+                        user_profile=make_user_profile(age, gender, bmi, history),
+                        symptoms=symptoms,
+                        category=triage_result['category'],
+                        keywords=triage_result['keywords']
+                    )
+                else:
+                    metrics.fallbacks.inc('shed')
+                    explanation_data = gemini.get_fallback_response(triage_result['category'], symptoms)
+            response_data = build_triage_response(triage_result, explanation_data)
+            if not response_data['degraded']:
+                await asyncio.to_thread(triage_cache.set, key, response_data)
+        return response_data
+    finally:
+        if token is not None:
+            await asyncio.to_thread(triage_cache.release_lock, key, token)
+
+async def explain_batch(items: list) -> list:
+    """
+    Run get_triage_and_explanation_async for (args, triage_result) pairs
+    concurrently, at most BATCH_CONCURRENCY at a time, starting in list
+    order. Failed items come back as exceptions.
+    """
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def explain(args, triage_result):
+        async with limit:
+            return await get_triage_and_explanation_async(*args, triage_result=triage_result)
+
+    return await asyncio.gather(*(explain(args, triage_result) for args, triage_result in items),
+                                return_exceptions=True)
+
 # --- Page Routes ---
 
 @app.route('/')
@@ -82,27 +268,59 @@ def water_tool():
 def health_check():
     """A simple health check endpoint to confirm the API is running."""
     return jsonify({"status": "ok", "message": "TriageXpert API is running."}), 200
+
+@app.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """Per-tier in-flight, queue depth, admitted and shed counts for this worker."""
+    return jsonify(triage_scheduler.stats()), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Counters for the triage cache and, if enabled, the explanation cache."""
+    explanation_cache = gemini.explanation_cache
+    return jsonify({
+        "triage": triage_cache.stats(),
+        "explanation": explanation_cache.stats() if explanation_cache is not None else None
+    }), 200
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's stage timings and counters."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
     
 # --- Main API Endpoint ---
 
-@app.route('/triage', methods=['POST'])
-def handle_triage():
-    """Handles the main triage logic, receiving user data from the frontend."""
-    data = request.get_json()
-    if not data or 'symptoms' not in data:
-        return jsonify({"error": "Invalid input. Symptom data is missing."}), 400
+def parse_patient_record(data):
+    """
+    Validate one patient record from a request body.
+    Returns (args, None) where args are the get_triage_and_explanation
+    arguments, or (None, error_message) if the record is invalid.
+    """
+    if not isinstance(data, dict) or 'symptoms' not in data:
+        return None, "Invalid input. Symptom data is missing."
 
     # Extract all data from the modal form
-    symptoms = data.get('symptoms', '').strip()
+    symptoms = str(data.get('symptoms') or '').strip()
     age = data.get('age')
     gender = data.get('gender')
     height_cm = data.get('height')
     weight_kg = data.get('weight')
-    # Convert history list to a sorted tuple to make it hashable (cacheable)
-    history = tuple(sorted(data.get('history', []))) 
+    history = data.get('history') or []
 
     if not all([symptoms, age, gender, height_cm, weight_kg]):
-        return jsonify({"error": "Missing required fields (symptoms, age, gender, height, weight)."}), 400
+        return None, "Missing required fields (symptoms, age, gender, height, weight)."
+
+    if not isinstance(gender, str):
+        return None, "Gender must be a string."
+    if not isinstance(history, list) or not all(isinstance(item, str) for item in history):
+        return None, "History must be a list of strings."
+    # Convert history list to a sorted tuple to make it hashable (cacheable)
+    history = tuple(sorted(history))
+
+    try:
+        age = int(age)
+    except (ValueError, TypeError):
+        return None, "Age must be a whole number."
 
     # Calculate BMI, with error handling for invalid data
     try:
@@ -111,133 +329,153 @@ def handle_triage():
     except (ValueError, TypeError, ZeroDivisionError):
         bmi = 0.0 # Default to 0 if data is invalid
 
+    return (symptoms, age, gender, bmi, history), None
+
+@app.route('/triage', methods=['POST'])
+def handle_triage():
+    """Handles the main triage logic, receiving user data from the frontend."""
+    with metrics.timed('request_parse'):
+        data = request.get_json(silent=True)
+        args, error = parse_patient_record(data)
+    if error:
+        return jsonify({"error": error}), 400
+
     try:
         # Call the main cached function to get the analysis
-        final_response = get_triage_and_explanation(symptoms, int(age), gender, bmi, history)
+        with metrics.timed('request'), metrics.sampled_profile('triage'):
+            final_response = get_triage_and_explanation(*args)
+        metrics.categories.inc(final_response['triage_category'])
         return jsonify(final_response), 200
     except Exception as e:
         print(f"An unexpected error occurred in /triage endpoint: {e}")
         return jsonify({"error": "An internal server error occurred while analyzing symptoms."}), 500
 
+@app.route('/triage/stream', methods=['POST'])
+def handle_triage_stream():
+    """
+    Streaming variant of /triage that responds with NDJSON, one event per line.
+    The keyword triage is sent as soon as it is ready; the Gemini
+    explanation follows in a second event, then a final "done" event.
+    """
+    with metrics.timed('request_parse'):
+        data = request.get_json(silent=True)
+        args, error = parse_patient_record(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    def generate():
+        triage_result = classify_symptoms(args[0])
+        metrics.categories.inc(triage_result['category'])
+        yield json.dumps({
+            "event": "triage",
+            "triage_category": triage_result['category'],
+            "confidence": round(triage_result.get('confidence', 0.0), 2),
+            "keywords": triage_result['keywords']
+        }) + "\n"
+
+        try:
+            # Reuse the first event's result so the explanation matches it
+            final_response = get_triage_and_explanation(*args, triage_result=triage_result)
+            yield json.dumps({
+                "event": "explanation",
+                "explanation_details": final_response['explanation_details'],
+                "degraded": final_response.get('degraded', False)
+            }) + "\n"
+        except Exception as e:
+            print(f"An unexpected error occurred in /triage/stream endpoint: {e}")
+            yield json.dumps({
+                "event": "error",
+                "error": "An internal server error occurred while analyzing symptoms."
+            }) + "\n"
+        yield json.dumps({"event": "done"}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        # Keep proxies such as nginx from holding the first event back
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/triage/batch', methods=['POST'])
+def handle_triage_batch():
+    """
+    Triage an array of patient records in one request.
+    Accepts either a JSON array or {"records": [...]} and returns results in
+    input order; invalid or failed records get an "error" entry instead.
+    """
+    with metrics.timed('request_parse'):
+        data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "Invalid input. Expected a non-empty array of patient records."}), 400
+    if len(records) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many records. The batch limit is {BATCH_MAX_ITEMS}."}), 413
+
+    results = [None] * len(records)
+    valid = []
+    for index, record in enumerate(records):
+        args, error = parse_patient_record(record)
+        if error:
+            results[index] = {"error": error}
+        else:
+            valid.append((index, args))
+
+    # One pass through the NLP layer, so explanations can be started most
+    # urgent first and a failed explanation still reports its category
+    with metrics.timed('nlp_classify_batch'):
+        triage_results = nlp.triage_symptoms_batch([args[0] for _, args in valid])
+    for triage_result in triage_results:
+        metrics.categories.inc(triage_result['category'])
+    profiles = {}
+    for (index, args), triage_result in zip(valid, triage_results):
+        profiles.setdefault(args, (triage_result, []))[1].append(index)
+
+    # Identical profiles share one call, which also goes through the cache.
+    # The fan-out runs on gemini's event loop rather than a thread per item
+    ordered = sorted(profiles.items(), key=lambda item: CATEGORY_PRIORITY.get(item[1][0]['category'], len(CATEGORY_PRIORITY)))
+    outcomes = gemini.run_async(explain_batch(
+        [(args, triage_result) for args, (triage_result, _) in ordered]
+    )).result()
+
+    for (args, (triage_result, indices)), item in zip(ordered, outcomes):
+        if isinstance(item, BaseException):
+            print(f"An unexpected error occurred in /triage/batch endpoint: {item}")
+            item = {
+                "error": "An internal server error occurred while analyzing symptoms.",
+                "triage_category": triage_result['category'],
+                "confidence": round(triage_result.get('confidence', 0.0), 2),
+                "keywords": triage_result['keywords']
+            }
+        for index in indices:
+            results[index] = item
+
+    return jsonify({"count": len(results), "results": results}), 200
+
 # --- Health Hub API Endpoint ---
 
+def serve_precomputed(precomputed: content.PrecomputedResponse) -> Response:
+    """
+    Serve a PrecomputedResponse in the client's preferred encoding, with a
+    strong ETag and Cache-Control, answering a matching If-None-Match
+    with 304 Not Modified.
+    """
+    accepted = {value: quality for value, quality in request.accept_encodings}
+    body, etag, encoding = precomputed.select(accepted)
+    if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=precomputed.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={content.STATIC_MAX_AGE}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 @app.route('/api/health-tips/<category>')
 def get_health_tips(category):
     """API endpoint for dynamic health tips loading."""
-    health_data = {
-        'monsoon': {
-            'sections': [
-                {
-                    'name': 'Dengue Prevention',
-                    'icon': '🦟',
-                    'tips': [
-                        'Remove stagnant water from containers and plant pots',
-                        'Use mosquito nets during dawn and dusk hours',
-                        'Wear long-sleeved clothing when outdoors',
-                        'Apply mosquito repellent on exposed skin',
-                        'Seek medical help for high fever with body aches'
-                    ]
-                },
-                {
-                    'name': 'Malaria Prevention',
-                    'icon': '🛏️',
-                    'tips': [
-                        'Sleep under insecticide-treated bed nets',
-                        'Ensure proper drainage around living areas',
-                        'Use approved mosquito repellents regularly',
-                        'Take antimalarial medication for high-risk areas',
-                        'Get tested immediately for persistent fever'
-                    ]
-                },
-                {
-                    'name': 'Water-borne Disease Prevention',
-                    'icon': '💧',
-                    'tips': [
-                        'Drink only boiled or properly purified water',
-                        'Avoid street food during monsoon season',
-                        'Wash hands with soap for 20 seconds frequently',
-                        'Store water in clean, covered containers',
-                        'Use ORS solution for diarrhea treatment'
-                    ]
-                }
-            ]
-        },
-        'heart': {
-            'sections': [
-                {
-                    'name': 'Blood Pressure Control',
-                    'icon': '❤️',
-                    'tips': [
-                        'Limit salt intake to maximum 5 grams daily',
-                        'Include potassium-rich foods like bananas',
-                        'Practice yoga and meditation for 30 minutes',
-                        'Monitor blood pressure regularly at home',
-                        'Maintain healthy BMI between 18.5-24.9'
-                    ]
-                },
-                {
-                    'name': 'Cholesterol Management',
-                    'icon': '🥗',
-                    'tips': [
-                        'Cook with healthy oils like olive or mustard oil',
-                        'Eat fiber-rich foods including oats and lentils',
-                        'Include fish in diet twice weekly',
-                        'Avoid trans fats and processed foods',
-                        'Get annual lipid profile testing after age 30'
-                    ]
-                },
-                {
-                    'name': 'Exercise & Stress Relief',
-                    'icon': '🧘',
-                    'tips': [
-                        'Walk briskly for minimum 30 minutes daily',
-                        'Practice pranayama breathing exercises',
-                        'Engage in swimming or cycling regularly',
-                        'Maintain proper work-life balance',
-                        'Get 7-8 hours of quality sleep nightly'
-                    ]
-                }
-            ]
-        },
-        'diabetes': {
-            'sections': [
-                {
-                    'name': 'Low-Glycemic Nutrition',
-                    'icon': '🌾',
-                    'tips': [
-                        'Choose whole grains: brown rice, ragi, quinoa',
-                        'Fill half your plate with non-starchy vegetables',
-                        'Select low-GI fruits like apples and oranges',
-                        'Eliminate sugary drinks and processed snacks',
-                        'Practice portion control with smaller meals'
-                    ]
-                },
-                {
-                    'name': 'Weight Management',
-                    'icon': '⚖️',
-                    'tips': [
-                        'Target BMI between 18.5-22.9 for Indians',
-                        'Monitor waist size: men <90cm, women <80cm',
-                        'Practice mindful eating and slow chewing',
-                        'Drink 8-10 glasses of water daily',
-                        'Prioritize 7-8 hours of restful sleep'
-                    ]
-                },
-                {
-                    'name': 'Physical Activity',
-                    'icon': '🏃',
-                    'tips': [
-                        'Exercise minimum 150 minutes weekly',
-                        'Combine aerobic and strength training',
-                        'Take stairs instead of elevators',
-                        'Practice traditional surya namaskara',
-                        'Monitor blood glucose if at high risk'
-                    ]
-                }
-            ]
-        }
-    }
-    return jsonify(health_data.get(category, {}))
+    return serve_precomputed(content.health_tips().get(category, content.EMPTY_RESPONSE))
 
 if __name__ == '__main__':
     # Runs the Flask app in debug mode for development
@@ -0,0 +1,114 @@
+"""
+Classifier backend throughput: keyword rules vs the NumPy linear model,
+single-text and batched.
+
+No labelled data ships with the repo, so a linear model is trained on a
+synthetic corpus built from the triage lexicon plus paraphrases the
+lexicon misses. Its accuracy number only shows that the pipeline works;
+the speed numbers are what this benchmark is for.
+
+Usage: python benchmarks/bench_classifier.py [--records N] [--batch-size N] [--output report.json]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import emit, environment, summarize
+
+import nlp
+import train_classifier
+
+# Phrasings the exact-match lexicon does not contain
+PARAPHRASES = {
+    'Emergency': ['crushing pressure in my chest', 'cannot breathe properly', 'lips turning blue',
+                  'face drooping on one side', 'passed out and not waking', 'coughing up a lot of blood'],
+    'Urgent': ['temperature of 103', 'throwing up all day', 'twisted my ankle badly and it is swollen',
+               'burning when i pee', 'ear pain with pus', 'stomach cramps that will not stop'],
+    'Routine': ['a bit of a sniffle', 'slightly itchy eyes', 'tired after work',
+                'small pimple on my chin', 'dry skin on elbows', 'trouble falling asleep lately'],
+}
+FILLERS = ['since yesterday', 'for two days', 'this morning', 'on and off', 'after lunch',
+           'my mother has', 'my son has', 'i have', 'please help', 'getting worse']
+
+
+def synthetic_corpus(records, seed):
+    rng = random.Random(seed)
+    for _ in range(records):
+        category = rng.choice(nlp.CATEGORIES)
+        phrases = nlp.TIER_KEYWORDS[category] + PARAPHRASES[category]
+        words = [rng.choice(FILLERS), rng.choice(phrases)]
+        if rng.random() < 0.5:
+            words.append(rng.choice(FILLERS))
+        yield {'symptoms': ' '.join(words), 'category': category}
+
+
+def measure_single(backend, texts):
+    nlp.configure_classifier_backend(backend)
+    latencies = []
+    start = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        nlp.triage_symptoms(text)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start, unit='us')
+
+
+def measure_batch(backend, texts, batch_size):
+    nlp.configure_classifier_backend(backend)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        t0 = time.perf_counter()
+        nlp.triage_symptoms_batch(texts[i:i + batch_size])
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    report = summarize(latencies, elapsed, unit='ms')
+    report['texts_per_sec'] = round(len(texts) / elapsed, 1)
+    report['batch_size'] = batch_size
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classifier backend benchmark.')
+    parser.add_argument('--records', type=int, default=20000, help='synthetic training records')
+    parser.add_argument('--texts', type=int, default=20000, help='texts classified per measurement')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_path = os.path.join(workdir, 'train.jsonl')
+        with open(data_path, 'w', encoding='utf-8') as f:
+            for record in synthetic_corpus(args.records, seed=1):
+                f.write(json.dumps(record) + '\n')
+        model_dir = os.path.join(workdir, 'model')
+        train_start = time.perf_counter()
+        train_classifier.main([data_path, '-o', model_dir, '--epochs', '3'])
+        train_seconds = time.perf_counter() - train_start
+        linear = nlp.LinearBackend.load(model_dir)
+
+        # Unique texts, so batch dedupe does not flatter the numbers
+        test = list(synthetic_corpus(args.texts, seed=2))
+        texts = [f"{record['symptoms']} #{i}" for i, record in enumerate(test)]
+        results = {}
+        for backend in (nlp.KeywordBackend(), linear):
+            nlp.configure_classifier_backend(backend)
+            predicted = nlp.triage_symptoms_batch(texts)
+            correct = sum(result['category'] == record['category'] for result, record in zip(predicted, test))
+            results[backend.name] = {
+                'accuracy_synthetic': round(correct / len(test), 4),
+                'single': measure_single(backend, texts[:min(len(texts), 5000)]),
+                'batch': measure_batch(backend, texts, args.batch_size),
+            }
+        nlp.configure_classifier_backend(None)
+
+    emit({'benchmark': 'classifier', 'environment': environment(), 'train_records': args.records,
+          'train_seconds': round(train_seconds, 2), 'n_features': linear.n_features, 'results': results},
+         args.output)
+
+
+if __name__ == '__main__':
+    main()
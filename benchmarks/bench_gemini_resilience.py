@@ -0,0 +1,90 @@
+"""
+Resilience harness for the Gemini path using a local fake model.
+
+Drives concurrent explanation requests through GeminiHealthAnalyzer while the
+fake upstream goes from healthy, to slow, to failing, and back to healthy
+(a half-open probe closes the breaker, then traffic flows normally).
+It reports latency percentiles and the degraded share for each phase, and
+exits non-zero if any phase's p99 goes over the deadline plus a margin.
+
+Usage: python benchmarks/bench_gemini_resilience.py [--requests N] [--threads N]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentile
+from fake_gemini import FakeModel
+
+import gemini
+
+PHASES = [
+    # name, latency seconds, error rate
+    ('healthy', 0.05, 0.0),
+    ('slow', 3.0, 0.0),
+    ('failing', 0.05, 1.0),
+    ('recovered', 0.05, 0.0),
+    ('steady', 0.05, 0.0),
+]
+PROFILE = {'age': 35, 'gender': 'female', 'bmi': 23.5, 'history': []}
+
+
+def run_phase(analyzer, name, requests, threads):
+    def one(i):
+        start = time.perf_counter()
+        # Unique symptoms so in-flight coalescing does not hide latency
+        result = analyzer.generate_structured_explanation(PROFILE, f"{name} case {i}: fever", 'Urgent', ['fever'])
+        return time.perf_counter() - start, bool(result.get('degraded'))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        'phase': name,
+        'requests': requests,
+        'degraded': sum(1 for _, degraded in outcomes if degraded),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1),
+        'breaker_state': analyzer.circuit_breaker.state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gemini deadline and circuit breaker harness.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('--margin', type=float, default=0.25, help='allowed p99 overshoot in seconds')
+    parser.add_argument('--client-mode', choices=['async', 'thread'], default=gemini.GEMINI_CLIENT_MODE)
+    args = parser.parse_args()
+
+    gemini.configure_explanation_cache(None)
+    model = FakeModel()
+    analyzer = gemini.GeminiHealthAnalyzer(
+        model=model, timeout=args.timeout, slow_call_seconds=args.timeout * 0.8,
+        circuit_breaker=gemini.CircuitBreaker(failure_threshold=5, reset_timeout=0.5),
+        client_mode=args.client_mode,
+    )
+
+    results = []
+    for name, latency, error_rate in PHASES:
+        model.latency, model.error_rate = latency, error_rate
+        if name == 'recovered':
+            # Let the breaker reach half-open so a probe can close it
+            time.sleep(analyzer.circuit_breaker.reset_timeout)
+        results.append(run_phase(analyzer, name, args.requests, args.threads))
+
+    budget_ms = (args.timeout + args.margin) * 1000
+    report = {'client_mode': args.client_mode, 'deadline_ms': args.timeout * 1000, 'model_calls': model.calls, 'phases': results,
+              'p99_within_budget': all(r['p99_ms'] <= budget_ms for r in results)}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['p99_within_budget'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Keyword extraction latency as the triage lexicon grows.
+
+Compares the precompiled Aho-Corasick matcher in nlp.py against the old
+per-phrase substring scan, for lexicons from the shipped 44 phrases up to 10k.
+The typo-tolerant SymptomMatcher is timed on a misspelled text, both with
+its correction cache warm and with the cache cleared before every call.
+
+Usage: python benchmarks/bench_keywords.py [--repeat N]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp
+
+SAMPLE_TEXT = (
+    "For the last two days I have had severe chest pain that spreads to my left arm, "
+    "along with difficulty breathing, dizziness and a high fever. I also feel fatigue "
+    "and have a mild headache most mornings, plus a runny nose since the weekend."
+)
+TYPO_TEXT = (
+    "For the last two days I have had severe chest pian that spreads to my left arm, "
+    "along with dificulty breathing, dizzyness and a hight fever. Also SOB on the stairs."
+)
+LEXICON_SIZES = [44, 100, 1000, 5000, 10000]
+
+
+def synthetic_lexicon(size, seed=7):
+    """Pad the real lexicon with random two-word phrases up to size."""
+    rng = random.Random(seed)
+    tier_keywords = {tier: list(words) for tier, words in nlp.TIER_KEYWORDS.items()}
+    tiers = list(tier_keywords)
+    total = sum(len(words) for words in tier_keywords.values())
+    while total < size:
+        phrase = ' '.join(
+            ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+            for _ in range(2)
+        )
+        tier_keywords[rng.choice(tiers)].append(phrase)
+        total += 1
+    return tier_keywords
+
+
+def naive_extract(tier_keywords, text):
+    text_lower = text.lower()
+    found = []
+    for keywords in tier_keywords.values():
+        for keyword in keywords:
+            if keyword in text_lower:
+                found.append(keyword)
+    return list(set(found))
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+    # The typo-correction word list loads on first use; keep it out of the timings
+    nlp.is_dictionary_word('warm')
+
+    print(f"{'phrases':>8} {'build ms':>10} {'automaton us':>14} {'naive us':>10} "
+          f"{'fuzzy build ms':>15} {'fuzzy us':>9} {'fuzzy cold us':>14}")
+    for size in LEXICON_SIZES:
+        tier_keywords = synthetic_lexicon(size)
+        start = time.perf_counter()
+        matcher = nlp.KeywordMatcher(tier_keywords)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        automaton_us = time_per_call(lambda: matcher.find_all(SAMPLE_TEXT), args.repeat)
+        naive_us = time_per_call(lambda: naive_extract(tier_keywords, SAMPLE_TEXT), args.repeat)
+
+        start = time.perf_counter()
+        fuzzy = nlp.SymptomMatcher(tier_keywords, nlp.SYMPTOM_SYNONYMS)
+        fuzzy_build_ms = (time.perf_counter() - start) * 1e3
+        fuzzy_us = time_per_call(lambda: fuzzy.find_all(TYPO_TEXT), args.repeat)
+
+        def cold():
+            fuzzy.fuzzy.lookup.cache_clear()
+            fuzzy.find_all(TYPO_TEXT)
+        cold_us = time_per_call(cold, max(1, args.repeat // 10))
+        print(f"{len(matcher):>8} {build_ms:>10.1f} {automaton_us:>14.1f} {naive_us:>10.1f} "
+              f"{fuzzy_build_ms:>15.1f} {fuzzy_us:>9.1f} {cold_us:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
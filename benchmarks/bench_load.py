@@ -0,0 +1,179 @@
+"""
+End-to-end load generator for the triage API.
+
+By default it drives the Flask app in-process through its test client, with
+the Gemini model replaced by the local FakeModel. Latency, error rate and
+response size are configurable, so no API key or network is needed. With
+--url it sends real HTTP requests to a running server instead. The server
+is then responsible for its own model.
+
+--repeat-ratio controls how often a request repeats an earlier profile,
+which is what drives the cache hit rate. With --endpoint /triage/batch
+the records are posted --batch-size at a time, and latencies are per batch.
+
+Usage:
+    python benchmarks/bench_load.py --requests 2000 --concurrency 32 --latency 0.2
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000 --endpoint /triage
+    python benchmarks/bench_load.py --endpoint /triage/batch --batch-size 50
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from common import emit, environment, summarize
+from fake_gemini import FakeModel
+
+SYMPTOMS = [
+    "chest pain and difficulty breathing",
+    "high fever with severe headache",
+    "runny nose and sore throat",
+    "persistent vomiting and dehydration",
+    "mild rash on my arm",
+    "dizziness and fainting this morning",
+    "muscle ache and fatigue",
+    "seasonal allergies and insomnia",
+]
+
+
+def make_records(count, repeat_ratio, seed):
+    rng = random.Random(seed)
+    seen = []
+    for i in range(count):
+        if seen and rng.random() < repeat_ratio:
+            yield rng.choice(seen)
+            continue
+        record = {
+            "symptoms": f"{rng.choice(SYMPTOMS)} (case {i})",
+            "age": rng.randint(5, 90),
+            "gender": rng.choice(["male", "female"]),
+            "height": rng.randint(140, 195),
+            "weight": rng.randint(40, 110),
+            "history": rng.sample(["diabetes", "hypertension", "asthma"], k=rng.randint(0, 2)),
+        }
+        seen.append(record)
+        yield record
+
+
+class InProcessClient:
+    def __init__(self, args):
+        # A private cache per run keeps results independent of earlier runs
+        os.environ.setdefault('TRIAGE_CACHE_URL', args.cache_url)
+        import app
+        import gemini
+        self.model = FakeModel(latency=args.latency, error_rate=args.error_rate,
+                               response_size=args.response_size, seed=args.seed)
+        gemini._health_analyzer = gemini.GeminiHealthAnalyzer(model=self.model)
+        self.app = app.app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def post(self, path, payload):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.get_data()
+
+    def get_json(self, path):
+        return self._client().get(path).get_json()
+
+
+class HttpClient:
+    def __init__(self, args):
+        self.base_url = args.url.rstrip('/')
+        self.model = None
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get_json(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=10) as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, ValueError):
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end triage load generator.')
+    parser.add_argument('--url', help='target a running server instead of the in-process app')
+    parser.add_argument('--endpoint', default='/triage', choices=['/triage', '/triage/stream', '/triage/batch'])
+    parser.add_argument('--batch-size', type=int, default=50, help='records per /triage/batch request')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5, help='share of requests repeating a profile')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake model latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fake model error probability')
+    parser.add_argument('--response-size', type=int, default=0, help='fake model reply size in characters')
+    parser.add_argument('--cache-url', default='memory://', help='TRIAGE_CACHE_URL for in-process runs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    client = HttpClient(args) if args.url else InProcessClient(args)
+    records = list(make_records(args.requests, args.repeat_ratio, args.seed))
+    if args.endpoint == '/triage/batch':
+        payloads = [records[i:i + args.batch_size] for i in range(0, len(records), args.batch_size)]
+    else:
+        payloads = records
+    statuses = Counter()
+    degraded = 0
+    lock = threading.Lock()
+
+    def one(payload):
+        nonlocal degraded
+        t0 = time.perf_counter()
+        status, body = client.post(args.endpoint, payload)
+        latency = time.perf_counter() - t0
+        if args.endpoint == '/triage/batch':
+            try:
+                count = sum(1 for item in json.loads(body)['results'] if item.get('degraded'))
+            except (ValueError, KeyError, TypeError):
+                count = 0
+        else:
+            count = 1 if b'"degraded": true' in body or b'"degraded":true' in body else 0
+        with lock:
+            statuses[status] += 1
+            degraded += count
+        return latency
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one, payloads))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'benchmark': 'load',
+        'environment': environment(),
+        'target': args.url or 'in-process',
+        'endpoint': args.endpoint,
+        'config': {k: getattr(args, k) for k in ('requests', 'concurrency', 'repeat_ratio', 'latency',
+                                                 'error_rate', 'response_size', 'batch_size')},
+        'results': summarize(latencies, elapsed),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'degraded_responses': degraded,
+        'model_calls': client.model.calls if client.model else None,
+        'cache': client.get_json('/cache/stats'),
+    }
+    emit(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
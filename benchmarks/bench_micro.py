@@ -0,0 +1,72 @@
+"""
+Microbenchmarks for the NLP hot path: keyword extraction, preprocessing,
+single-text classification and batch classification.
+
+Usage: python benchmarks/bench_micro.py [--iterations N] [--output report.json]
+"""
+import argparse
+import time
+
+from common import emit, environment, summarize
+
+import nlp
+
+TEXTS = [
+    "I have severe chest pain and difficulty breathing since this morning",
+    "Runny nose, sore throat and a mild headache for two days",
+    "High fever with persistent vomiting and dizziness, my child seems confused",
+    "Feeling tired lately, some insomnia and muscle ache after the gym",
+    "Small minor cut on my finger from cooking, a bit of bleeding",
+    "My father fainted and has blood in stool, also abdominal pain",
+]
+
+
+def measure(fn, iterations):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        text = TEXTS[i % len(TEXTS)]
+        t0 = time.perf_counter()
+        fn(text)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start, unit='us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NLP microbenchmarks.')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    classifier = nlp.classifier
+    # Keep one-time table loading out of the timings
+    classifier.load_preprocessing_tables()
+
+    results = {
+        'extract_keywords': measure(classifier.extract_keywords, args.iterations),
+        'preprocess_text': measure(classifier.preprocess_text, args.iterations),
+        'triage_symptoms': measure(nlp.triage_symptoms, args.iterations),
+        'triage_symptoms_preprocess': measure(lambda t: nlp.triage_symptoms(t, preprocess=True), args.iterations),
+    }
+
+    batch = [f"{TEXTS[i % len(TEXTS)]} (case {i})" for i in range(args.batch_size)]
+    rounds = max(1, args.iterations // args.batch_size)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        nlp.triage_symptoms_batch(batch)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    batch_report = summarize(latencies, elapsed, unit='ms')
+    batch_report['texts_per_sec'] = round(rounds * args.batch_size / elapsed, 1)
+    batch_report['batch_size'] = args.batch_size
+    results['triage_symptoms_batch'] = batch_report
+
+    emit({'benchmark': 'micro', 'environment': environment(), 'lexicon_size': len(nlp.KEYWORD_MATCHER),
+          'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Worker startup cost: wall-clock import time and peak RSS for `import app`.
+
+Each measurement runs in a fresh interpreter, like a newly forked gunicorn
+worker. Pass --rev to also measure an older revision of the tree (checked
+out into a temporary directory with git archive) for a before/after view.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--rev baseline-sha]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+rss_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+warm = None
+if {warm!r} and hasattr(app, 'warm_up'):
+    start = time.perf_counter()
+    app.warm_up()
+    warm = time.perf_counter() - start
+print(json.dumps({{
+    'import_s': imported,
+    'warm_up_s': warm,
+    'rss_import_mb': rss_import / 1024,
+    'rss_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def measure(tree, runs, warm):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE.format(warm=warm)],
+            cwd=tree, capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples if s[key] is not None]
+        summary[key] = round(statistics.median(values), 4) if values else None
+    return summary
+
+
+def export_revision(rev, dest):
+    archive = os.path.join(dest, 'tree.tar')
+    subprocess.run(['git', 'archive', '-o', archive, rev], cwd=REPO_ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(dest)
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-worker import time and RSS.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--rev', help='git revision to compare against')
+    parser.add_argument('--warm', action='store_true', help='also time app.warm_up()')
+    args = parser.parse_args()
+
+    results = {'current': measure(REPO_ROOT, args.runs, args.warm)}
+    if args.rev:
+        with tempfile.TemporaryDirectory() as tmp:
+            results[args.rev] = measure(export_revision(args.rev, tmp), args.runs, args.warm)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
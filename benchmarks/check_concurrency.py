@@ -0,0 +1,239 @@
+"""
+Regression checks for the concurrency primitives whose guarantees are easy
+to break and hard to notice: the PriorityScheduler's admission order,
+shedding and cancellation, SingleFlight / AsyncSingleFlight coalescing,
+and the Gemini CircuitBreaker's state machine.
+
+Every check runs in-process in a few seconds with no network. The report
+lists each check as passed or failed, and the script exits with status 1
+if any failed.
+
+Usage: python benchmarks/check_concurrency.py [--output report.json]
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+from common import emit, environment
+
+import cache
+import gemini
+import scheduler
+
+
+def make_scheduler(total=1, max_queue=100, max_wait=5.0):
+    return scheduler.PriorityScheduler(
+        total_limit=total,
+        limits={tier: total for tier in scheduler.TIERS},
+        max_queue={tier: max_queue for tier in scheduler.TIERS},
+        max_wait={tier: max_wait for tier in scheduler.TIERS},
+    )
+
+
+def is_idle(sched):
+    """No slot held, nobody queued and no async waiter left behind."""
+    stats = sched.stats()
+    return (stats['in_flight'] == 0 and not sched._waiting and not sched._async_waiters
+            and all(tier['queued'] == 0 for tier in stats['tiers'].values()))
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+# --- Scheduler ---
+
+def check_thread_priority():
+    """Thread waiters: an Emergency request queued last is admitted before earlier Routine ones."""
+    sched = make_scheduler()
+    sched.acquire('Routine')
+    order = []
+
+    def waiter(category):
+        with sched.slot(category) as admitted:
+            order.append((category, admitted))
+            time.sleep(0.005)
+
+    threads = []
+    for category in ['Routine'] * 5 + ['Emergency']:
+        thread = threading.Thread(target=waiter, args=(category,))
+        thread.start()
+        threads.append(thread)
+        # Queue them in a known order
+        wait_until(lambda: len(sched._waiting) == len(threads))
+    sched.release('Routine')
+    for thread in threads:
+        thread.join()
+    return order[0] == ('Emergency', True) and len(order) == 6 and is_idle(sched), order[:2]
+
+
+async def async_priority():
+    sched = make_scheduler()
+    assert await sched.acquire_async('Routine')
+    order = []
+
+    async def waiter(category):
+        async with sched.slot_async(category) as admitted:
+            order.append((category, admitted))
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.ensure_future(waiter('Routine')) for _ in range(50)]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.ensure_future(waiter('Emergency')))
+    await asyncio.sleep(0.01)
+    queued = len(sched._waiting)
+    sched.release('Routine')
+    await asyncio.gather(*tasks)
+    passed = queued == 51 and order[0] == ('Emergency', True) and len(order) == 51 and is_idle(sched)
+    return passed, {'queued': queued, 'first': order[0]}
+
+
+async def async_cancellation():
+    sched = make_scheduler()
+    assert await sched.acquire_async('Urgent')
+    cancelled = asyncio.ensure_future(sched.acquire_async('Emergency'))
+    follower = asyncio.ensure_future(sched.acquire_async('Routine'))
+    await asyncio.sleep(0.01)
+    cancelled.cancel()
+    await asyncio.sleep(0.01)
+    # The cancelled ticket must not block the next waiter or keep a slot
+    sched.release('Urgent')
+    admitted = await asyncio.wait_for(follower, 1.0)
+    sched.release('Routine')
+    return cancelled.cancelled() and admitted and is_idle(sched), {'follower_admitted': admitted}
+
+
+async def async_shedding():
+    sched = make_scheduler(max_queue=1, max_wait=0.05)
+    assert await sched.acquire_async('Routine')
+    timed_out, queue_full = await asyncio.gather(sched.acquire_async('Routine'), sched.acquire_async('Routine'))
+    sched.release('Routine')
+    shed = sched.stats()['tiers']['Routine']['shed']
+    return not timed_out and not queue_full and shed == 2 and is_idle(sched), {'shed': shed}
+
+
+# --- Single flight ---
+
+def check_single_flight():
+    """Concurrent callers for one key run the function once and share its result and its error."""
+    flight = cache.SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait()
+        return {'value': len(calls)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', compute))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.coalesced == 9)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    errors = []
+
+    def fail():
+        time.sleep(0.05)
+        raise RuntimeError('upstream failed')
+
+    def call_failing():
+        try:
+            flight.do('bad', fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call_failing) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    passed = (len(calls) == 1 and results == [{'value': 1}] * 10 and len(errors) == 5
+              and not flight._calls)
+    return passed, {'calls': len(calls), 'errors_shared': len(errors)}
+
+
+async def async_single_flight():
+    flight = cache.AsyncSingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'value': 1}
+
+    waiters = [asyncio.ensure_future(flight.do('key', compute)) for _ in range(10)]
+    await asyncio.sleep(0.01)
+    # A caller giving up must not cancel the shared computation
+    waiters[0].cancel()
+    results = await asyncio.gather(*waiters[1:])
+    passed = len(calls) == 1 and results == [{'value': 1}] * 9 and waiters[0].cancelled() and not flight._tasks
+    return passed, {'calls': len(calls), 'coalesced': flight.coalesced}
+
+
+# --- Circuit breaker ---
+
+def check_circuit_breaker():
+    """closed -> open after the threshold -> half_open with a single probe -> closed or open again."""
+    breaker = gemini.CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    states = []
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    states.append(breaker.state)
+    refused = not breaker.allow_request()
+    time.sleep(0.06)
+    probe, second = breaker.allow_request(), breaker.allow_request()
+    states.append(breaker.state)
+    breaker.record_failure()
+    states.append(breaker.state)
+    time.sleep(0.06)
+    breaker.allow_request()
+    breaker.record_success()
+    states.append(breaker.state)
+    expected = ['open', 'half_open', 'open', 'closed']
+    return states == expected and refused and probe and not second, {'states': states}
+
+
+CHECKS = [
+    ('scheduler_thread_priority', check_thread_priority),
+    ('scheduler_async_priority', lambda: asyncio.run(async_priority())),
+    ('scheduler_async_cancellation', lambda: asyncio.run(async_cancellation())),
+    ('scheduler_async_shedding', lambda: asyncio.run(async_shedding())),
+    ('single_flight', check_single_flight),
+    ('async_single_flight', lambda: asyncio.run(async_single_flight())),
+    ('circuit_breaker', check_circuit_breaker),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrency regression checks.')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for name, check in CHECKS:
+        try:
+            passed, detail = check()
+        except Exception as e:
+            passed, detail = False, f'{type(e).__name__}: {e}'
+        results[name] = {'passed': bool(passed), 'detail': repr(detail)}
+    failed = [name for name, result in results.items() if not result['passed']]
+    emit({'benchmark': 'concurrency_checks', 'environment': environment(), 'results': results,
+          'failed': failed}, args.output)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
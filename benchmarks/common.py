@@ -0,0 +1,49 @@
+"""Shared helpers for the benchmark scripts: percentiles and JSON reports."""
+import json
+import os
+import platform
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed, unit='ms'):
+    """Throughput and latency percentiles for per-call latencies in seconds."""
+    scale = {'ms': 1e3, 'us': 1e6}[unit]
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'throughput_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+        f'p50_{unit}': round(percentile(latencies, 50) * scale, 3),
+        f'p95_{unit}': round(percentile(latencies, 95) * scale, 3),
+        f'p99_{unit}': round(percentile(latencies, 99) * scale, 3),
+        f'max_{unit}': round(max(latencies) * scale, 3),
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def emit(report, path=None):
+    """Print the report as JSON and optionally save it for later comparison."""
+    text = json.dumps(report, indent=2)
+    print(text)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
@@ -0,0 +1,66 @@
+"""
+Compare two benchmark reports and flag regressions.
+
+Latency percentiles (p50/p95/p99) regress when they grow and throughput
+metrics when they shrink, by more than --threshold percent. Exits 1 if any
+metric regressed, so it can gate a release.
+
+Usage: python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+# max_ is a single sample and too noisy to gate on
+LATENCY_PREFIXES = ('p50_', 'p95_', 'p99_')
+THROUGHPUT_KEYS = ('throughput_per_sec', 'texts_per_sec', 'records_per_sec', 'hit_rate')
+
+
+def flatten(report, prefix=''):
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, path + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, key, value
+
+
+def compare(baseline, candidate, threshold):
+    base = {path: value for path, _, value in flatten(baseline.get('results', baseline))}
+    rows = []
+    for path, key, new in flatten(candidate.get('results', candidate)):
+        old = base.get(path)
+        if old in (None, 0):
+            continue
+        change = (new - old) / old * 100
+        if key.startswith(LATENCY_PREFIXES):
+            regressed = change > threshold
+        elif key in THROUGHPUT_KEYS:
+            regressed = change < -threshold
+        else:
+            continue
+        rows.append({'metric': path, 'baseline': old, 'candidate': new,
+                     'change_pct': round(change, 1), 'regressed': regressed})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag regressions between two benchmark reports.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed change in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    regressions = [row for row in rows if row['regressed']]
+    print(json.dumps({'threshold_pct': args.threshold, 'regressions': regressions, 'compared': rows}, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Gemini model with injectable latency and failures.
+
+FakeModel implements the slice of google.generativeai.GenerativeModel that
+gemini.py uses: generate_content(prompt, request_options=...) and its
+coroutine twin generate_content_async, both returning an object with a
+.text attribute.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import types
+
+SAMPLE_EXPLANATION = {
+    "summary": "Symptoms are consistent with a condition that should be assessed by a clinician.",
+    "urgency_level": "Routine",
+    "potential_conditions": ["Viral infection", "Muscle strain", "Dehydration"],
+    "immediate_actions": ["Rest", "Stay hydrated", "Monitor symptoms"],
+    "red_flags": ["Breathing difficulty", "Persistent high fever"],
+    "follow_up_recommendations": ["See a doctor if symptoms persist"],
+    "lifestyle_advice": ["Sleep well", "Eat balanced meals", "Avoid strenuous activity"],
+    "when_to_seek_help": "Seek care if symptoms worsen or new symptoms appear.",
+    "disclaimer": "This is not a medical diagnosis."
+}
+
+
+class FakeModel:
+    """
+    latency: seconds per call, or a callable returning seconds.
+    error_rate: probability that a call raises.
+    response_size: approximate length in characters of the reply text.
+    fenced: wrap the reply in a ```json code fence like the real model does.
+    """
+    def __init__(self, latency=0.05, error_rate=0.0, response_size=None, fenced=True, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.response_size = response_size
+        self.fenced = fenced
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_latency(self):
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _reply(self):
+        explanation = dict(SAMPLE_EXPLANATION)
+        if self.response_size:
+            padding = self.response_size - len(json.dumps(explanation))
+            if padding > 0:
+                explanation["summary"] += " " + "x" * padding
+        text = json.dumps(explanation)
+        return f"```json\n{text}\n```" if self.fenced else text
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+        latency = self._next_latency()
+        timeout = (request_options or {}).get('timeout')
+        # Like the real client, give up once the request timeout is reached
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("fake model request timed out")
+        time.sleep(latency)
+        if fail:
+            raise RuntimeError("fake model error")
+        return types.SimpleNamespace(text=self._reply())
+
+    async def generate_content_async(self, prompt, request_options=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+        latency = self._next_latency()
+        timeout = (request_options or {}).get('timeout')
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError("fake model request timed out")
+        await asyncio.sleep(latency)
+        if fail:
+            raise RuntimeError("fake model error")
+        return types.SimpleNamespace(text=self._reply())
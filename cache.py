@@ -0,0 +1,481 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+# Canonical key settings: profiles that differ by less than a bucket share
+# one cache entry (and one paid Gemini call)
+AGE_BUCKET_YEARS = int(os.getenv('TRIAGE_CACHE_AGE_BUCKET', '5'))
+BMI_BUCKET = float(os.getenv('TRIAGE_CACHE_BMI_BUCKET', '1.0'))
+
+DEFAULT_TTL_SECONDS = float(os.getenv('TRIAGE_CACHE_TTL', '3600'))
+DEFAULT_MAX_ENTRIES = int(os.getenv('TRIAGE_CACHE_MAX_ENTRIES', '10000'))
+# The default SQLite file lives in the app's instance directory, which is
+# made private to the service user. A shared location such as /tmp would let
+# other local users plant entries that are served back as explanations
+DEFAULT_CACHE_DIR = os.getenv('TRIAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
+SQLITE_FILENAME = 'triage-cache.sqlite3'
+# How long a worker may hold the compute lock for a key before others give
+# up waiting and compute it themselves
+DEFAULT_LOCK_TIMEOUT = float(os.getenv('TRIAGE_CACHE_LOCK_TIMEOUT', '30'))
+
+
+def normalize_symptoms(symptoms: str) -> str:
+    """Lowercase and collapse whitespace so trivially different texts match."""
+    return ' '.join(symptoms.lower().split())
+
+
+def bucket(value: float, width: float) -> float:
+    """Round value down to the start of its bucket."""
+    if width <= 0:
+        return value
+    return (value // width) * width
+
+
+def make_triage_key(symptoms: str, age: int, gender: str, bmi: float, history: Iterable[str]) -> str:
+    """Build the canonical cache key for one triage request."""
+    canonical = [
+        normalize_symptoms(symptoms),
+        bucket(int(age), AGE_BUCKET_YEARS),
+        (gender or '').strip().lower(),
+        bucket(float(bmi), BMI_BUCKET),
+        sorted({str(item).strip().lower() for item in history}),
+    ]
+    encoded = json.dumps(canonical, separators=(',', ':'))
+    return 'triage:' + hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class TriageCache:
+    """
+    Base class for cache backends. Values must be JSON-serializable.
+    Backends count hits, misses and evictions (expired or size-trimmed
+    entries) for the current process.
+    """
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._counter_lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look a key up, counting the hit or miss."""
+        value = self.peek(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """Look a key up without touching the hit/miss counters."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def acquire_lock(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> Optional[str]:
+        """
+        Try to become the one worker computing key. Returns an owner token,
+        or None if another worker holds the lock. The lock lapses after
+        timeout seconds in case its owner dies. Backends that are not
+        shared between processes always succeed.
+        """
+        return 'local'
+
+    def release_lock(self, key: str, token: str) -> None:
+        pass
+
+    def is_locked(self, key: str) -> bool:
+        """Whether some worker currently holds the compute lock for key."""
+        return False
+
+    def _poll(self, key: str) -> Tuple[Optional[Dict], bool]:
+        """One wait_for step: (value, keep_waiting)."""
+        value = self.peek(key)
+        if value is not None:
+            return value, False
+        if not self.is_locked(key):
+            # The owner finished without storing a value (it failed, or its
+            # result was degraded); check once more in case it stored then
+            # released between the two reads
+            return self.peek(key), False
+        return None, True
+
+    def wait_for(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT, interval: float = 0.05) -> Optional[Dict]:
+        """
+        Poll until another worker stores key. Returns None as soon as its
+        lock is released without a stored value, or after timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value, keep_waiting = self._poll(key)
+            if not keep_waiting:
+                return value
+            time.sleep(interval)
+        return None
+
+    async def wait_for_async(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT,
+                             interval: float = 0.05) -> Optional[Dict]:
+        """
+        Coroutine version of wait_for. Each poll runs in a thread, since a
+        shared backend may block, and the loop is free between polls.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value, keep_waiting = await asyncio.to_thread(self._poll, key)
+            if not keep_waiting:
+                return value
+            await asyncio.sleep(interval)
+        return None
+
+    def stats(self) -> Dict:
+        with self._counter_lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = type(self).__name__
+        return stats
+
+
+class MemoryCache(TriageCache):
+    """In-process LRU cache with TTL. Not shared between workers."""
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                self._count('evictions')
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(TriageCache):
+    """
+    Cache stored in a local SQLite file, shared by every worker process on
+    the host. When full, the entries closest to expiry (the oldest) are
+    removed first, so reads never need a write.
+    """
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS triage_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS triage_cache_expiry ON triage_cache (expires_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS triage_cache_locks ('
+                'key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def peek(self, key: str) -> Optional[Dict]:
+        conn = self._connection()
+        row = conn.execute('SELECT value, expires_at FROM triage_cache WHERE key = ?', (key,)).fetchone()
+        if row is not None and row[1] <= time.time():
+            with conn:
+                conn.execute('DELETE FROM triage_cache WHERE key = ? AND expires_at <= ?', (key, time.time()))
+            self._count('evictions')
+            row = None
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict) -> None:
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO triage_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), now + self.ttl)
+            )
+            evicted = conn.execute('DELETE FROM triage_cache WHERE expires_at <= ?', (now,)).rowcount
+            overflow = conn.execute('SELECT COUNT(*) FROM triage_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                evicted += conn.execute(
+                    'DELETE FROM triage_cache WHERE key IN '
+                    '(SELECT key FROM triage_cache ORDER BY expires_at LIMIT ?)', (overflow,)
+                ).rowcount
+        if evicted:
+            self._count('evictions', evicted)
+
+    def clear(self) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM triage_cache')
+
+    def acquire_lock(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> Optional[str]:
+        conn = self._connection()
+        token = uuid.uuid4().hex
+        now = time.time()
+        with conn:
+            conn.execute('DELETE FROM triage_cache_locks WHERE key = ? AND expires_at <= ?', (key, now))
+            acquired = conn.execute(
+                'INSERT OR IGNORE INTO triage_cache_locks (key, token, expires_at) VALUES (?, ?, ?)',
+                (key, token, now + timeout)
+            ).rowcount
+        return token if acquired else None
+
+    def release_lock(self, key: str, token: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM triage_cache_locks WHERE key = ? AND token = ?', (key, token))
+
+    def is_locked(self, key: str) -> bool:
+        row = self._connection().execute(
+            'SELECT 1 FROM triage_cache_locks WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+
+class RedisCache(TriageCache):
+    """
+    Adapter for Redis or any server speaking its protocol. Requires the
+    optional 'redis' package. Size-bounded eviction is left to the server's
+    maxmemory policy; expiry uses native key TTLs.
+    """
+    def __init__(self, url: str, ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 prefix: str = 'triagexpert:'):
+        super().__init__(ttl, max_entries)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisCache needs the 'redis' package: pip install redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    # Delete the lock only if it still belongs to the caller
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def peek(self, key: str) -> Optional[Dict]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Dict) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def acquire_lock(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = self.client.set(self.prefix + 'lock:' + key, token, nx=True, px=max(1, int(timeout * 1000)))
+        return token if acquired else None
+
+    def release_lock(self, key: str, token: str) -> None:
+        self.client.eval(self.RELEASE_SCRIPT, 1, self.prefix + 'lock:' + key, token)
+
+    def is_locked(self, key: str) -> bool:
+        return bool(self.client.exists(self.prefix + 'lock:' + key))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within this process: the
+    first caller runs the function, later callers wait for and share its
+    result (or its exception).
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Dict]) -> Dict:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight. All callers must share one event
+    loop; a cancelled waiter does not cancel the shared computation.
+    """
+    def __init__(self):
+        self._tasks = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+class FailSafeCache(TriageCache):
+    """
+    Wraps a shared backend so that its failures (a locked or corrupt SQLite
+    file, an unreachable Redis) count as misses instead of failing the
+    request. The cache only saves Gemini calls; triage must work without it.
+    """
+    def __init__(self, backend: TriageCache):
+        super().__init__(backend.ttl, backend.max_entries)
+        self.backend = backend
+        self._counters['errors'] = 0
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        self._count('errors')
+        print(f"Triage cache {operation} failed, continuing without the cache: {error}", file=sys.stderr)
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.peek(key)
+        self.backend._count('hits' if value is not None else 'misses')
+        return value
+
+    def peek(self, key: str) -> Optional[Dict]:
+        try:
+            return self.backend.peek(key)
+        except Exception as e:
+            self._failed('read', e)
+            return None
+
+    def set(self, key: str, value: Dict) -> None:
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            self._failed('write', e)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def acquire_lock(self, key: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> Optional[str]:
+        try:
+            return self.backend.acquire_lock(key, timeout)
+        except Exception as e:
+            # Compute without the lock rather than wait on a broken backend
+            self._failed('lock', e)
+            return 'local'
+
+    def release_lock(self, key: str, token: str) -> None:
+        try:
+            self.backend.release_lock(key, token)
+        except Exception as e:
+            # The lock lapses on its own after its timeout
+            self._failed('unlock', e)
+
+    def is_locked(self, key: str) -> bool:
+        try:
+            return self.backend.is_locked(key)
+        except Exception as e:
+            self._failed('lock check', e)
+            return False
+
+    def stats(self) -> Dict:
+        stats = self.backend.stats()
+        with self._counter_lock:
+            stats['errors'] = self._counters['errors']
+        return stats
+
+
+def private_sqlite_path(directory: str) -> str:
+    """Create directory with owner-only permissions and return the cache file path in it."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # makedirs leaves an existing directory's mode alone
+    os.chmod(directory, 0o700)
+    return os.path.join(directory, SQLITE_FILENAME)
+
+
+def create_cache(url: Optional[str] = None, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES) -> TriageCache:
+    """
+    Build a cache backend from a URL, defaulting to TRIAGE_CACHE_URL:
+    'memory://', 'sqlite:////path/to/file.sqlite3' or 'redis://host:6379/0'.
+    Without a URL, a SQLite file in DEFAULT_CACHE_DIR is shared by all
+    workers on the host. Shared backends are wrapped in FailSafeCache, and
+    one that cannot be opened is replaced by a MemoryCache.
+    """
+    url = url or os.getenv('TRIAGE_CACHE_URL', '')
+    if url.startswith('memory://'):
+        return MemoryCache(ttl, max_entries)
+    if url and not url.startswith(('redis://', 'rediss://', 'unix://', 'sqlite:///')):
+        raise ValueError(f"Unsupported TRIAGE_CACHE_URL: {url}")
+    try:
+        if url.startswith('sqlite:///'):
+            # sqlite:///relative/file or sqlite:////absolute/file
+            backend = SQLiteCache(url[len('sqlite:///'):] or private_sqlite_path(DEFAULT_CACHE_DIR), ttl, max_entries)
+        elif url:
+            backend = RedisCache(url, ttl, max_entries)
+        else:
+            backend = SQLiteCache(private_sqlite_path(DEFAULT_CACHE_DIR), ttl, max_entries)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not open the triage cache, using an in-process cache instead: {e}", file=sys.stderr)
+        return MemoryCache(ttl, max_entries)
+    return FailSafeCache(backend)
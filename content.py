@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+# Static content ships as versioned JSON files; bump the version in the file
+# name when the shape changes so old and new deployments never mix them
+CONTENT_DIR = os.getenv('TRIAGE_CONTENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+HEALTH_TIPS_FILE = 'health_tips.v1.json'
+FALLBACK_EXPLANATIONS_FILE = 'fallback_explanations.v1.json'
+
+# Browsers and CDNs may reuse a static response for this long before
+# revalidating it with If-None-Match
+STATIC_MAX_AGE = int(os.getenv('TRIAGE_STATIC_MAX_AGE', '3600'))
+
+
+def load_json(filename: str):
+    """Read one of the content files from CONTENT_DIR."""
+    with open(os.path.join(CONTENT_DIR, filename), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class PrecomputedResponse:
+    """
+    A JSON body serialized once, with its strong ETag and compressed
+    variants, so serving it is a dictionary lookup.
+
+    Each encoding gets its own ETag because the bytes differ. Brotli is
+    only produced when the optional 'brotli' package is installed.
+    Variants that would not be smaller than the plain body are skipped.
+    """
+    def __init__(self, body: bytes, mimetype: str = 'application/json'):
+        self.mimetype = mimetype
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, Tuple[bytes, str]] = {'identity': (body, etag)}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        try:
+            import brotli
+            compressed['br'] = brotli.compress(body, quality=11)
+        except ImportError:
+            pass
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'{etag}-{encoding}')
+
+    @classmethod
+    def from_obj(cls, obj) -> 'PrecomputedResponse':
+        return cls(json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def select(self, accepted: Dict[str, float]) -> Tuple[bytes, str, Optional[str]]:
+        """
+        Pick the best variant for the client's accepted encodings (name to
+        q-value). Returns (body, etag, content_encoding or None).
+        """
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, 0) > 0:
+                body, etag = self.variants[encoding]
+                return body, etag, encoding
+        body, etag = self.variants['identity']
+        return body, etag, None
+
+
+_health_tips = None
+_fallback_explanations = None
+
+
+def health_tips() -> Dict[str, PrecomputedResponse]:
+    """Health-hub tips per category, loaded and serialized on first use."""
+    global _health_tips
+    if _health_tips is None:
+        _health_tips = {category: PrecomputedResponse.from_obj(data)
+                        for category, data in load_json(HEALTH_TIPS_FILE).items()}
+    return _health_tips
+
+
+def fallback_explanations() -> Dict[str, Dict]:
+    """Static explanations per triage category, loaded on first use."""
+    global _fallback_explanations
+    if _fallback_explanations is None:
+        _fallback_explanations = load_json(FALLBACK_EXPLANATIONS_FILE)
+    return _fallback_explanations
+
+
+# Served for unknown health-tip categories, as before
+EMPTY_RESPONSE = PrecomputedResponse.from_obj({})
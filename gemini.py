@@ -1,114 +1,714 @@
+import asyncio
+import hashlib
+import json
 import os
-import google.generativeai as genai
-from typing import Dict, List
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+import cache
+import content
+import metrics
 
-class GeminiHealthAnalyzer:
+class ExplanationCachePolicy:
+    """
+    Admin-set rules for when a stored explanation may be reused.
+
+    age_band / bmi_band: profile bucket widths (0 disables banding).
+    match_history: whether medical history must match exactly.
+    min_keyword_overlap: Jaccard similarity required between keyword sets;
+        1.0 reuses only identical sets.
+    """
+    def __init__(self, age_band: int = 10, bmi_band: float = 5.0, match_history: bool = True,
+                 min_keyword_overlap: float = 1.0, max_entries: int = 5000, ttl: float = 86400.0):
+        self.age_band = age_band
+        self.bmi_band = bmi_band
+        self.match_history = match_history
+        self.min_keyword_overlap = min_keyword_overlap
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls) -> 'ExplanationCachePolicy':
+        return cls(
+            age_band=int(os.getenv('GEMINI_EXPLANATION_CACHE_AGE_BAND', '10')),
+            bmi_band=float(os.getenv('GEMINI_EXPLANATION_CACHE_BMI_BAND', '5')),
+            match_history=os.getenv('GEMINI_EXPLANATION_CACHE_MATCH_HISTORY', '1') != '0',
+            min_keyword_overlap=float(os.getenv('GEMINI_EXPLANATION_CACHE_MIN_OVERLAP', '1.0')),
+            max_entries=int(os.getenv('GEMINI_EXPLANATION_CACHE_MAX_ENTRIES', '5000')),
+            ttl=float(os.getenv('GEMINI_EXPLANATION_CACHE_TTL', '86400')),
+        )
+
+class ExplanationCache:
+    """
+    Second-level cache of model explanations keyed on the triage category,
+    the keyword set and a coarse patient profile rather than on the exact
+    symptom wording, so rephrased symptoms can skip the model call.
+    Requests without keywords are never served from it, since their
+    explanation depends entirely on the free text.
+    """
+    def __init__(self, policy: ExplanationCachePolicy):
+        self.policy = policy
+        self._entries = OrderedDict()   # (profile_key, keywords) -> (expires_at, explanation)
+        self._by_profile = {}           # profile_key -> set of keyword sets
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def _profile_key(self, user_profile: Dict, category: str) -> Optional[Tuple]:
+        try:
+            age_band = cache.bucket(int(user_profile.get('age')), self.policy.age_band)
+            bmi_band = cache.bucket(float(user_profile.get('bmi')), self.policy.bmi_band)
+        except (TypeError, ValueError):
+            return None
+        history = None
+        if self.policy.match_history:
+            history = tuple(sorted({str(item).strip().lower() for item in user_profile.get('history') or []}))
+        return category, age_band, bmi_band, history
+
+    def _remove(self, entry_key: Tuple) -> None:
+        del self._entries[entry_key]
+        profile_key, keywords = entry_key
+        keyword_sets = self._by_profile[profile_key]
+        keyword_sets.discard(keywords)
+        if not keyword_sets:
+            del self._by_profile[profile_key]
+
+    def _find(self, profile_key: Tuple, keywords: FrozenSet[str]) -> Optional[Tuple]:
+        if (profile_key, keywords) in self._entries:
+            return profile_key, keywords
+        if self.policy.min_keyword_overlap >= 1.0:
+            return None
+        best, best_score = None, self.policy.min_keyword_overlap
+        for candidate in self._by_profile.get(profile_key, ()):
+            score = len(candidate & keywords) / len(candidate | keywords)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return (profile_key, best) if best is not None else None
+
+    def get(self, user_profile: Dict, category: str, keywords: List[str]) -> Optional[Dict]:
+        profile_key = self._profile_key(user_profile, category)
+        if profile_key is None or not keywords:
+            return None
+        with self._lock:
+            entry_key = self._find(profile_key, frozenset(keywords))
+            if entry_key is not None and self._entries[entry_key][0] <= time.time():
+                self._remove(entry_key)
+                entry_key = None
+            if entry_key is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            self._counters['hits'] += 1
+            return self._entries[entry_key][1]
+
+    def set(self, user_profile: Dict, category: str, keywords: List[str], explanation: Dict) -> None:
+        profile_key = self._profile_key(user_profile, category)
+        if profile_key is None or not keywords:
+            return
+        entry_key = (profile_key, frozenset(keywords))
+        with self._lock:
+            self._entries[entry_key] = (time.time() + self.policy.ttl, explanation)
+            self._entries.move_to_end(entry_key)
+            self._by_profile.setdefault(profile_key, set()).add(entry_key[1])
+            self._counters['stores'] += 1
+            while len(self._entries) > self.policy.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+# Disabled unless GEMINI_EXPLANATION_CACHE=1 or configure_explanation_cache is called
+explanation_cache = (ExplanationCache(ExplanationCachePolicy.from_env())
+                     if os.getenv('GEMINI_EXPLANATION_CACHE', '0') == '1' else None)
+
+def configure_explanation_cache(policy: Optional[ExplanationCachePolicy]) -> None:
+    """Enable the explanation cache with a new policy, or disable it with None."""
+    global explanation_cache
+    explanation_cache = ExplanationCache(policy) if policy is not None else None
+
+# Identical prompts in flight at the same time share one model call
+model_flight = cache.SingleFlight()
+
+# --- Latency budget ---
+# Seconds a request waits for the model before serving the fallback
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '8'))
+# Calls slower than this count as failures for the circuit breaker
+GEMINI_SLOW_CALL_SECONDS = float(os.getenv('GEMINI_SLOW_CALL_SECONDS', '5'))
+# Model calls allowed in flight at once per worker
+GEMINI_MAX_INFLIGHT = int(os.getenv('GEMINI_MAX_INFLIGHT', '16'))
+
+class CircuitBreaker:
+    """
+    Stops calling the model after repeated failures or slow responses.
+
+    closed: calls go through; failure_threshold consecutive failures open it.
+    open: calls are refused until reset_timeout seconds have passed.
+    half_open: one probe call is let through; success closes the breaker,
+        failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'CircuitBreaker':
+        return cls(
+            failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', '30')),
+        )
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+# 'async' multiplexes every model call in the worker onto one event loop
+# thread; 'thread' gives each in-flight call its own pool thread
+GEMINI_CLIENT_MODE = os.getenv('GEMINI_CLIENT_MODE', 'async')
+
+class AsyncLoopRunner:
+    """
+    A private asyncio event loop running in a daemon thread. Synchronous
+    code hands coroutines to it with submit() and waits on the returned
+    concurrent.futures.Future.
+    """
+    def __init__(self, name: str = 'gemini-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+_async_runner = None
+_async_runner_lock = threading.Lock()
+
+def get_async_runner() -> AsyncLoopRunner:
+    """Return the worker's shared Gemini event loop, starting it on first call."""
+    global _async_runner
+    if _async_runner is None:
+        with _async_runner_lock:
+            if _async_runner is None:
+                _async_runner = AsyncLoopRunner()
+    return _async_runner
+
+def run_async(coro):
+    """Schedule a coroutine on the shared Gemini event loop; returns a Future."""
+    return get_async_runner().submit(coro)
+
+# Coroutine counterpart of model_flight, used on the shared event loop
+model_async_flight = cache.AsyncSingleFlight()
+
+# --- Prompt construction ---
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-pro')
+# Send the fixed instructions once as the model's system instruction instead
+# of in every prompt. Needs a model that supports it (Gemini 1.5 and later)
+GEMINI_SYSTEM_INSTRUCTION = os.getenv('GEMINI_SYSTEM_INSTRUCTION', '0') == '1'
+# Longest symptom and history text sent to the model, in estimated tokens
+GEMINI_SYMPTOM_TOKEN_BUDGET = int(os.getenv('GEMINI_SYMPTOM_TOKEN_BUDGET', '300'))
+GEMINI_HISTORY_TOKEN_BUDGET = int(os.getenv('GEMINI_HISTORY_TOKEN_BUDGET', '100'))
+# Rough size of an English token; good enough for budgeting without a
+# tokenizer round trip
+CHARS_PER_TOKEN = 4
+
+PROMPT_INSTRUCTIONS = (
+    "You are a medical AI assistant. Give a structured health assessment of the patient below, "
+    "for information only, not diagnosis. Always recommend consulting healthcare professionals, "
+    "be specific to the Indian healthcare context where relevant and consider age and BMI. "
+    "Reply with only a JSON object: "
+    '{"summary":"2-3 sentences","urgency_level":"the triage category",'
+    '"potential_conditions":[3 strings],"immediate_actions":[3 strings],"red_flags":[2 strings],'
+    '"follow_up_recommendations":[2 strings],"lifestyle_advice":[3 strings],'
+    '"when_to_seek_help":"when to get immediate care","disclaimer":"medical disclaimer"}'
+)
+PATIENT_TEMPLATE = (
+    "Age: {age}\nGender: {gender}\nBMI: {bmi}\nHistory: {history}\n"
+    "Symptoms: {symptoms}\nTriage category: {category}\nKeywords: {keywords}"
+)
+
+_SENTENCE_PATTERN = re.compile(r'[^.!?\n]+[.!?]*')
+
+prompt_tokens = metrics.REGISTRY.histogram(
+    'gemini_prompt_tokens', 'Prompt size per Gemini call (estimated, or as reported by the API).',
+    ('source',), buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+prompt_truncations = metrics.REGISTRY.counter(
+    'gemini_prompt_truncated', 'Prompt fields cut down to their token budget.', ('field',))
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def truncate_to_budget(text: str, budget_tokens: int, keywords: Sequence[str] = ()) -> str:
+    """
+    Cut text to about budget_tokens. Sentences mentioning a triage keyword
+    are kept first, then the earliest remaining sentences, all in their
+    original order, so a long pasted history keeps the relevant parts.
+    """
+    text = ' '.join(text.split())
+    limit = budget_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    sentences = [match.group().strip() for match in _SENTENCE_PATTERN.finditer(text)]
+    lowered = [sentence.lower() for sentence in sentences]
+    ranked = [i for i, sentence in enumerate(lowered) if any(keyword in sentence for keyword in keywords)]
+    preferred = set(ranked)
+    ranked += [i for i in range(len(sentences)) if i not in preferred]
+    kept, used = set(), 0
+    for i in ranked:
+        if used + len(sentences[i]) + 1 > limit:
+            continue
+        kept.add(i)
+        used += len(sentences[i]) + 1
+    if not kept:
+        return text[:limit].rsplit(' ', 1)[0] + ' [truncated]'
+    return ' '.join(sentences[i] for i in sorted(kept)) + ' [truncated]'
+
+def build_prompt(user_profile: Dict, symptoms: str, category: str, keywords: List[str],
+                 include_instructions: bool = True) -> str:
+    """The compact prompt: fixed instructions, then the budgeted patient fields."""
+    history = ', '.join(user_profile.get('history') or []) or 'None reported'
+    fields = {'symptoms': (symptoms, GEMINI_SYMPTOM_TOKEN_BUDGET), 'history': (history, GEMINI_HISTORY_TOKEN_BUDGET)}
+    budgeted = {}
+    for field, (text, budget) in fields.items():
+        budgeted[field] = truncate_to_budget(text, budget, keywords)
+        if budgeted[field].endswith(' [truncated]'):
+            prompt_truncations.inc(field)
+    patient = PATIENT_TEMPLATE.format(
+        age=user_profile.get('age', 'Unknown'),
+        gender=user_profile.get('gender', 'Unknown'),
+        bmi=user_profile.get('bmi', 'Unknown'),
+        category=category,
+        keywords=', '.join(keywords) or 'None',
+        **budgeted
+    )
+    prompt = f"{PROMPT_INSTRUCTIONS}\n\n{patient}" if include_instructions else patient
+    prompt_tokens.observe(estimate_tokens(prompt), 'estimated')
+    return prompt
+
+# --- Response parsing ---
+# Ask the model for application/json output instead of fenced text. Only
+# models that support response_mime_type (Gemini 1.5 and later) accept it
+GEMINI_JSON_MODE = os.getenv('GEMINI_JSON_MODE', '0') == '1'
+
+# The explanation schema: summary is required, everything else is filled in
+# with an empty value when the model leaves it out
+EXPLANATION_TEXT_FIELDS = ('summary', 'urgency_level', 'when_to_seek_help', 'disclaimer')
+EXPLANATION_LIST_FIELDS = ('potential_conditions', 'immediate_actions', 'red_flags',
+                           'follow_up_recommendations', 'lifestyle_advice')
+EXPLANATION_REQUIRED_FIELDS = ('summary',)
+
+_FENCE_PATTERN = re.compile(r'```[a-zA-Z]*\s*\n?(.*?)\s*```', re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+response_parse_results = metrics.REGISTRY.counter(
+    'gemini_response_parse', 'Gemini replies by parse result (ok, repaired, failed).', ('result',))
+
+class ResponseParseError(ValueError):
+    """The model's reply held no usable explanation object."""
+
+class JSONObjectExtractor:
+    """
+    Finds the first top-level JSON object in model output, skipping any
+    prose or code fence around it. Text can be fed as it streams in; feed()
+    returns the object's source once its closing brace arrives. Braces
+    inside strings are ignored.
+    """
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro')
-    
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.done:
+            return None
+        start = 0
+        if self._depth == 0:
+            start = chunk.find('{')
+            if start < 0:
+                return None
+        for i in range(start, len(chunk)):
+            char = chunk[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    self.done = True
+                    return ''.join(self._parts)
+        self._parts.append(chunk[start:])
+        return None
+
+def extract_json_object(text: str) -> Tuple[object, bool]:
+    """
+    Decode the JSON object in a model reply. Returns (value, repaired),
+    where repaired is True if the object had to be dug out of surrounding
+    prose or have trailing commas removed.
+    """
+    text = text.strip()
+    # Fast paths: bare JSON (native JSON mode) or a single fenced block
+    candidates = [text]
+    fence = _FENCE_PATTERN.search(text)
+    if fence:
+        candidates.append(fence.group(1))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate), False
+        except ValueError:
+            pass
+
+    # Slow path: try each balanced {...} in turn, so a brace in the prose
+    # ("{as requested}") does not hide the real object. The whole text is
+    # scanned too, in case a "```" inside a string cut the fence short
+    found = False
+    for source in ([fence.group(1), text] if fence else [text]):
+        for obj in _balanced_objects(source):
+            found = True
+            for attempt in (obj, _TRAILING_COMMA_PATTERN.sub(r'\1', obj)):
+                try:
+                    return json.loads(attempt), True
+                except ValueError:
+                    pass
+    if not found:
+        raise ResponseParseError("No JSON object found in model reply")
+    raise ResponseParseError("Model reply held malformed JSON")
+
+def _balanced_objects(text: str):
+    """Yield the balanced {...} starting at each opening brace in text, in order."""
+    start = text.find('{')
+    while start >= 0:
+        source = JSONObjectExtractor().feed(text[start:])
+        if source is not None:
+            yield source
+        start = text.find('{', start + 1)
+
+def validate_explanation(data: object, category: str) -> Tuple[Dict, bool]:
+    """
+    Check a decoded reply against the explanation schema. Returns the
+    explanation restricted to schema fields and whether anything had to be
+    coerced or filled in. Raises ResponseParseError if it is unusable.
+    """
+    if not isinstance(data, dict):
+        raise ResponseParseError("Model reply is not a JSON object")
+    missing = [field for field in EXPLANATION_REQUIRED_FIELDS if not data.get(field)]
+    if missing:
+        raise ResponseParseError(f"Model reply is missing {', '.join(missing)}")
+
+    repaired = False
+    explanation = {}
+    for field in EXPLANATION_TEXT_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            explanation[field] = value
+            continue
+        repaired = True
+        if value is None:
+            explanation[field] = category if field == 'urgency_level' else ''
+        elif isinstance(value, list):
+            explanation[field] = ' '.join(str(item) for item in value)
+        else:
+            explanation[field] = str(value)
+    for field in EXPLANATION_LIST_FIELDS:
+        value = data.get(field)
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            explanation[field] = value
+            continue
+        repaired = True
+        if value is None or value == '':
+            explanation[field] = []
+        elif isinstance(value, list):
+            explanation[field] = [str(item) for item in value if item is not None]
+        else:
+            explanation[field] = [str(value)]
+    return explanation, repaired
+
+def record_usage(response) -> None:
+    """Record the prompt token count the API reports, when it reports one."""
+    usage = getattr(response, 'usage_metadata', None)
+    count = getattr(usage, 'prompt_token_count', None)
+    if count:
+        prompt_tokens.observe(count, 'reported')
+
+def fallback_reason(error: Exception) -> str:
+    """Label for the fallbacks metric."""
+    if isinstance(error, TimeoutError):
+        return 'timeout'
+    if isinstance(error, ResponseParseError):
+        return 'parse'
+    return 'error'
+
+class GeminiHealthAnalyzer:
+    def __init__(self, model=None, timeout: float = GEMINI_TIMEOUT,
+                 slow_call_seconds: float = GEMINI_SLOW_CALL_SECONDS,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 client_mode: str = GEMINI_CLIENT_MODE, system_instruction: bool = False):
+        """
+        system_instruction: the model was created with PROMPT_INSTRUCTIONS as
+        its system instruction, so prompts carry only the patient fields.
+        """
+        if model is None:
+            # The client library is slow to import, so it is only loaded once
+            # an analyzer is actually needed
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            if GEMINI_SYSTEM_INSTRUCTION:
+                model = genai.GenerativeModel(GEMINI_MODEL, system_instruction=PROMPT_INSTRUCTIONS)
+            else:
+                model = genai.GenerativeModel(GEMINI_MODEL)
+            system_instruction = GEMINI_SYSTEM_INSTRUCTION
+        if client_mode not in ('async', 'thread'):
+            raise ValueError(f"Unknown Gemini client mode: {client_mode}")
+        self.model = model
+        self.timeout = timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.circuit_breaker = circuit_breaker or CircuitBreaker.from_env()
+        self.client_mode = client_mode
+        self.system_instruction = system_instruction
+        self._request_kwargs = {'request_options': {'timeout': timeout}}
+        if GEMINI_JSON_MODE:
+            self._request_kwargs['generation_config'] = {'response_mime_type': 'application/json'}
+        if client_mode == 'thread':
+            # Model calls run here so a request can stop waiting at its deadline
+            self._executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_INFLIGHT, thread_name_prefix='gemini')
+        else:
+            # Created on the event loop on first use
+            self._semaphore = None
+
+    def _record_outcome(self, start: float) -> None:
+        if time.monotonic() - start > self.slow_call_seconds:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def _call_model(self, prompt: str) -> str:
+        """Call the model within the deadline, reporting the outcome to the breaker."""
+        if self.client_mode == 'async':
+            # The coroutine enforces the deadline; the extra second only
+            # guards against a stalled event loop
+            return run_async(self._call_model_async(prompt)).result(timeout=self.timeout + 1.0)
+
+        start = time.monotonic()
+        future = self._executor.submit(
+            self.model.generate_content, prompt, **self._request_kwargs
+        )
+        try:
+            response = future.result(timeout=self.timeout)
+            text = response.text
+        except FutureTimeoutError:
+            future.cancel()
+            self.circuit_breaker.record_failure()
+            raise TimeoutError(f"Gemini call exceeded {self.timeout:.1f}s deadline")
+        except Exception:
+            self.circuit_breaker.record_failure()
+            raise
+        finally:
+            metrics.stage_seconds.observe(time.monotonic() - start, 'model_call')
+
+        self._record_outcome(start)
+        record_usage(response)
+        return text
+
+    async def _call_model_async(self, prompt: str) -> str:
+        """
+        Async version of _call_model. Runs on the shared event loop, where the
+        client keeps one persistent connection and the semaphore bounds the
+        number of calls in flight.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(GEMINI_MAX_INFLIGHT)
+
+        async def bounded_call():
+            async with self._semaphore:
+                return await self.model.generate_content_async(prompt, **self._request_kwargs)
+
+        start = time.monotonic()
+        try:
+            # The deadline covers time spent waiting for a free slot
+            response = await asyncio.wait_for(bounded_call(), timeout=self.timeout)
+            text = response.text
+        except asyncio.TimeoutError:
+            self.circuit_breaker.record_failure()
+            raise TimeoutError(f"Gemini call exceeded {self.timeout:.1f}s deadline")
+        except Exception:
+            self.circuit_breaker.record_failure()
+            raise
+        finally:
+            metrics.stage_seconds.observe(time.monotonic() - start, 'model_call')
+
+        self._record_outcome(start)
+        record_usage(response)
+        return text
+
+    def _build_prompt(self, user_profile: Dict, symptoms: str, category: str, keywords: List[str]) -> str:
+        return build_prompt(user_profile, symptoms, category, keywords,
+                            include_instructions=not self.system_instruction)
+
+    def _parse_response(self, response_text: str, category: str) -> Dict:
+        """Extract and validate the explanation, counting the parse result."""
+        try:
+            data, repaired = extract_json_object(response_text)
+            explanation, coerced = validate_explanation(data, category)
+        except ResponseParseError:
+            response_parse_results.inc('failed')
+            raise
+        response_parse_results.inc('repaired' if repaired or coerced else 'ok')
+        return explanation
+
     def generate_structured_explanation(self, user_profile: Dict, symptoms: str, category: str, keywords: List[str]) -> Dict:
         """Generate a comprehensive health explanation using Gemini AI."""
-        
-        prompt = f"""
-        You are a medical AI assistant. Analyze the following patient information and provide a structured health assessment:
-
-        Patient Profile:
-        - Age: {user_profile.get('age', 'Unknown')}
-        - Gender: {user_profile.get('gender', 'Unknown')}
-        - BMI: {user_profile.get('bmi', 'Unknown')}
-        - Medical History: {', '.join(user_profile.get('history', [])) if user_profile.get('history') else 'None reported'}
-
-        Reported Symptoms: {symptoms}
-        
-        Preliminary Triage Category: {category}
-        Identified Keywords: {', '.join(keywords)}
-
-        Please provide a JSON response with the following structure:
-        {{
-            "summary": "Brief 2-3 sentence summary of the condition",
-            "urgency_level": "{category}",
-            "potential_conditions": ["condition1", "condition2", "condition3"],
-            "immediate_actions": ["action1", "action2", "action3"],
-            "red_flags": ["flag1", "flag2"],
-            "follow_up_recommendations": ["recommendation1", "recommendation2"],
-            "lifestyle_advice": ["advice1", "advice2", "advice3"],
-            "when_to_seek_help": "Description of when immediate medical attention is needed",
-            "disclaimer": "Medical disclaimer text"
-        }}
-
-        Important: 
-        - This is for informational purposes only, not medical diagnosis
-        - Always recommend consulting healthcare professionals
-        - Be specific to Indian healthcare context where relevant
-        - Consider age and BMI in recommendations
-        """
+        semantic_cache = explanation_cache
+        if semantic_cache is not None:
+            cached = semantic_cache.get(user_profile, category, keywords)
+            if cached is not None:
+                return cached
+
+        if not self.circuit_breaker.allow_request():
+            # Upstream is failing or slow: answer immediately instead of queueing
+            metrics.fallbacks.inc('circuit_open')
+            return self._get_fallback_response(category, symptoms)
 
+        with metrics.timed('prompt_build'):
+            prompt = self._build_prompt(user_profile, symptoms, category, keywords)
         try:
-            response = self.model.generate_content(prompt)
-            # Parse the JSON response
-            import json
-            
-            # Clean the response text
-            response_text = response.text.strip()
-            if response_text.startswith('```'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-            
-            parsed_response = json.loads(response_text)
+            prompt_key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+            response_text = model_flight.do(prompt_key, lambda: self._call_model(prompt))
+            with metrics.timed('json_parse'):
+                parsed_response = self._parse_response(response_text, category)
+            # Only real model answers are stored, never fallbacks
+            if semantic_cache is not None:
+                semantic_cache.set(user_profile, category, keywords, parsed_response)
             return parsed_response
             
         except Exception as e:
-            print(f"Error with Gemini API: {e}")
+            print(f"Error with Gemini API: {e}", file=sys.stderr)
             # Fallback response
+            metrics.fallbacks.inc(fallback_reason(e))
+            return self._get_fallback_response(category, symptoms)
+
+    async def generate_structured_explanation_async(self, user_profile: Dict, symptoms: str, category: str,
+                                                    keywords: List[str]) -> Dict:
+        """
+        Coroutine version of generate_structured_explanation. Must run on the
+        shared Gemini event loop (see run_async).
+        """
+        semantic_cache = explanation_cache
+        if semantic_cache is not None:
+            cached = semantic_cache.get(user_profile, category, keywords)
+            if cached is not None:
+                return cached
+
+        if not self.circuit_breaker.allow_request():
+            metrics.fallbacks.inc('circuit_open')
+            return self._get_fallback_response(category, symptoms)
+
+        with metrics.timed('prompt_build'):
+            prompt = self._build_prompt(user_profile, symptoms, category, keywords)
+        try:
+            prompt_key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+            if self.client_mode == 'async':
+                response_text = await model_async_flight.do(prompt_key, lambda: self._call_model_async(prompt))
+            else:
+                loop = asyncio.get_running_loop()
+                response_text = await loop.run_in_executor(
+                    None, lambda: model_flight.do(prompt_key, lambda: self._call_model(prompt))
+                )
+            with metrics.timed('json_parse'):
+                parsed_response = self._parse_response(response_text, category)
+            if semantic_cache is not None:
+                semantic_cache.set(user_profile, category, keywords, parsed_response)
+            return parsed_response
+
+        except Exception as e:
+            print(f"Error with Gemini API: {e}", file=sys.stderr)
+            metrics.fallbacks.inc(fallback_reason(e))
             return self._get_fallback_response(category, symptoms)
     
-    def _get_fallback_response(self, category: str, symptoms: str) -> Dict:
-        """Provide a fallback response if Gemini API fails."""
-        fallback_responses = {
-            'Emergency': {
-                "summary": "Your symptoms suggest a potentially serious condition that requires immediate medical attention.",
-                "urgency_level": "Emergency",
-                "potential_conditions": ["Acute condition requiring immediate care"],
-                "immediate_actions": ["Call emergency services immediately", "Go to nearest emergency room", "Do not delay seeking help"],
-                "red_flags": ["Severe symptoms", "Rapid onset"],
-                "follow_up_recommendations": ["Emergency medical evaluation"],
-                "lifestyle_advice": ["Follow emergency protocols"],
-                "when_to_seek_help": "Seek immediate emergency medical care",
-                "disclaimer": "This is not a medical diagnosis. Seek immediate professional medical help."
-            },
-            'Urgent': {
-                "summary": "Your symptoms indicate a condition that should be evaluated by a healthcare provider soon.",
-                "urgency_level": "Urgent",
-                "potential_conditions": ["Condition requiring medical evaluation"],
-                "immediate_actions": ["Contact your doctor", "Consider urgent care visit", "Monitor symptoms"],
-                "red_flags": ["Worsening symptoms", "New concerning symptoms"],
-                "follow_up_recommendations": ["Medical evaluation within 24-48 hours"],
-                "lifestyle_advice": ["Rest", "Stay hydrated", "Avoid strenuous activities"],
-                "when_to_seek_help": "Contact healthcare provider if symptoms worsen",
-                "disclaimer": "This is not a medical diagnosis. Consult a healthcare professional for proper evaluation."
-            },
-            'Routine': {
-                "summary": "Your symptoms appear to be non-urgent but should still be monitored.",
-                "urgency_level": "Routine",
-                "potential_conditions": ["Common condition", "Self-limiting illness"],
-                "immediate_actions": ["Rest and self-care", "Monitor symptoms", "Stay hydrated"],
-                "red_flags": ["Symptoms getting worse", "Fever developing"],
-                "follow_up_recommendations": ["Schedule routine appointment if symptoms persist"],
-                "lifestyle_advice": ["Adequate rest", "Proper nutrition", "Stay hydrated"],
-                "when_to_seek_help": "Contact healthcare provider if symptoms persist beyond a week",
-                "disclaimer": "This is not a medical diagnosis. Consult a healthcare professional if you have concerns."
-            }
-        }
-        
-        return fallback_responses.get(category, fallback_responses['Routine'])
-
-# Initialize the analyzer
-health_analyzer = GeminiHealthAnalyzer()
+    @staticmethod
+    def _get_fallback_response(category: str, symptoms: str) -> Dict:
+        """
+        Provide a fallback response if Gemini API fails, times out or the
+        circuit breaker is open. Fallbacks are marked "degraded".
+        """
+        # Loaded once from data/; the dict() copy keeps the shared entry unmarked
+        fallback_responses = content.fallback_explanations()
+        return dict(fallback_responses.get(category, fallback_responses['Routine']), degraded=True)
+
+# The analyzer is created on first use (or by warm_up)
+_health_analyzer = None
+_health_analyzer_lock = threading.Lock()
+
+def get_health_analyzer() -> GeminiHealthAnalyzer:
+    """Return the shared analyzer, configuring the Gemini client on first call."""
+    global _health_analyzer
+    if _health_analyzer is None:
+        with _health_analyzer_lock:
+            if _health_analyzer is None:
+                _health_analyzer = GeminiHealthAnalyzer()
+    return _health_analyzer
+
+def warm_up() -> None:
+    """Optional hook to configure the Gemini client before the first request."""
+    get_health_analyzer()
 
 def generate_structured_explanation(user_profile: Dict, symptoms: str, category: str, keywords: List[str]) -> Dict:
     """Main function to generate health explanation."""
-    return health_analyzer.generate_structured_explanation(user_profile, symptoms, category, keywords)
+    return get_health_analyzer().generate_structured_explanation(user_profile, symptoms, category, keywords)
+
+def get_fallback_response(category: str, symptoms: str) -> Dict:
+    """The degraded fallback explanation, without configuring or calling the model."""
+    return GeminiHealthAnalyzer._get_fallback_response(category, symptoms)
+
+async def generate_structured_explanation_async(user_profile: Dict, symptoms: str, category: str,
+                                                keywords: List[str]) -> Dict:
+    """Coroutine version of generate_structured_explanation, for use on the shared event loop."""
+    return await get_health_analyzer().generate_structured_explanation_async(user_profile, symptoms, category, keywords)
@@ -0,0 +1,201 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers microsecond NLP stages up to multi-second model calls
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Fraction of timed requests to run under cProfile (0 disables profiling)
+PROFILE_SAMPLE_RATE = float(os.getenv('TRIAGE_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('TRIAGE_PROFILE_DIR', 'profiles')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing count per label combination. Samples and the
+    HELP/TYPE lines use the <name>_total family name, as prometheus_client does.
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.family = f'{name}_total'
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f'{self.family}{_labels(self.labelnames, labelvalues)} {_number(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        self.name = name
+        self.family = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}      # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for labelvalues, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _labels(self.labelnames, labelvalues, f'le="{le}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-2])}'
+            yield f'{self.name}_count{_labels(self.labelnames, labelvalues)} {series[-1]}'
+
+
+class Gauge:
+    """A value read from a callback at scrape time, e.g. queue depth."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.name = name
+        self.family = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterator[str]:
+        for labelvalues, value in self.collect():
+            yield f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}'
+
+
+class Registry:
+    """
+    Holds this process's metrics and renders them in the Prometheus text
+    format. Each gunicorn worker keeps its own registry, so a scrape
+    reports the worker that served it.
+    """
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str],
+              collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.family} {metric.help}')
+            lines.append(f'# TYPE {metric.family} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.histogram(
+    'triage_stage_seconds', 'Latency of each triage pipeline stage.', ('stage',))
+cache_lookups = REGISTRY.counter(
+    'triage_cache_lookups', 'Triage cache lookups by result.', ('result',))
+fallbacks = REGISTRY.counter(
+    'triage_fallback_explanations', 'Fallback explanations served, by reason.', ('reason',))
+categories = REGISTRY.counter(
+    'triage_category', 'Triage classifications by category.', ('category',))
+
+
+def timed(stage: str):
+    """Context manager recording the block's duration under stage."""
+    return stage_seconds.time(stage)
+
+
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def sampled_profile(name: str, rate: Optional[float] = None) -> Iterator[None]:
+    """
+    Profile a sampled fraction of calls with cProfile, writing one .prof file
+    per sample to TRIAGE_PROFILE_DIR. Only one sample runs at a time, and
+    unsampled calls pay a single random() call.
+    """
+    rate = PROFILE_SAMPLE_RATE if rate is None else rate
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f'{name}-{os.getpid()}-{time.time_ns()}.prof'))
+    finally:
+        _profile_lock.release()
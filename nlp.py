@@ -1,23 +1,15 @@
+import json
+import os
 import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
-import spacy
-
-# Download required NLTK data
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except:
-    pass
-
-# Load spacy model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("spaCy model not found. Using basic NLP processing.")
-    nlp = None
+import sys
+import threading
+import zlib
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple, Sequence
+
+# NLTK is only needed for the optional stemmed preprocessing, so it is
+# imported and initialized on first use rather than at module import.
 
 # Medical keyword mappings for triage categories
 EMERGENCY_KEYWORDS = [
@@ -40,61 +32,442 @@ ROUTINE_KEYWORDS = [
     'constipation', 'mild rash', 'seasonal allergies'
 ]
 
+# Tier lookup used to build the keyword automaton, in priority order
+TIER_KEYWORDS = {
+    'Emergency': EMERGENCY_KEYWORDS,
+    'Urgent': URGENT_KEYWORDS,
+    'Routine': ROUTINE_KEYWORDS,
+}
+
+# Endings a lexicon phrase may carry and still count as a match
+INFLECTION_SUFFIXES = frozenset({'s', 'es', 'd', 'ed', 'ing'})
+
+class KeywordMatch(NamedTuple):
+    """A lexicon phrase found in the (lowercased) symptom text."""
+    keyword: str
+    tier: str
+    start: int
+    end: int
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over the triage lexicon.
+    Finds every phrase, with its tier and offsets, in a single linear pass
+    over the text regardless of how many phrases the lexicon holds.
+    """
+    def __init__(self, tier_keywords):
+        self.tiers = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for tier, keywords in tier_keywords.items():
+            for keyword in keywords:
+                phrase = ' '.join(keyword.lower().split())
+                # First tier wins if a phrase is listed twice
+                if not phrase or phrase in self.tiers:
+                    continue
+                self.tiers[phrase] = tier
+                self._insert(phrase)
+
+        self._build_failure_links()
+
+    def _insert(self, phrase):
+        node = 0
+        for ch in phrase:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = child
+        self._out[node] = self._out[node] + (phrase,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                # Inherit matches that end at the same position
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def find_all(self, text):
+        """
+        Return every whole-word lexicon match in text, in text order.
+        A match's end includes any inflection suffix after the phrase.
+        """
+        text = text.lower()
+        goto, fail, out, tiers = self._goto, self._fail, self._out, self.tiers
+        length = len(text)
+        matches = []
+        node = 0
+
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            if end < length and text[end].isalnum():
+                # Accept inflected forms ("chest pains", "overdosed") but
+                # not unrelated longer words
+                word_end = end + 1
+                while word_end < length and text[word_end].isalnum():
+                    word_end += 1
+                if text[end:word_end] not in INFLECTION_SUFFIXES:
+                    continue
+            else:
+                word_end = end
+            for phrase in out[node]:
+                start = end - len(phrase)
+                if start == 0 or not text[start - 1].isalnum():
+                    matches.append(KeywordMatch(phrase, tiers[phrase], start, word_end))
+
+        return matches
+
+# Compiled once at import and shared by every classifier
+KEYWORD_MATCHER = KeywordMatcher(TIER_KEYWORDS)
+
+# --- Typo and synonym tolerant matching ---
+# Set to 0 to match the lexicon exactly as written
+FUZZY_MATCHING = os.getenv('TRIAGE_FUZZY_MATCHING', '1') == '1'
+# Optional JSON object of extra {"alias": "lexicon phrase"} entries
+SYNONYMS_FILE = os.getenv('TRIAGE_SYNONYMS_FILE', '')
+# Ordinary English words are never typo-corrected. They come from
+# TRIAGE_DICTIONARY_FILE (one word per line) if set, else from the wordfreq
+# package: words at or above this Zipf frequency (3.0 is about once per
+# million words) count as dictionary words
+DICTIONARY_FILE = os.getenv('TRIAGE_DICTIONARY_FILE', '')
+DICTIONARY_MIN_ZIPF = float(os.getenv('TRIAGE_DICTIONARY_MIN_ZIPF', '3.0'))
+
+# Abbreviations and lay terms for lexicon phrases; the target must be a
+# phrase in TIER_KEYWORDS. An alias written in capitals only matches when
+# typed in capitals, so "SOB" is an abbreviation but "sob" is not
+SYMPTOM_SYNONYMS = {
+    'SOB': 'difficulty breathing',
+    'shortness of breath': 'difficulty breathing',
+    'short of breath': 'difficulty breathing',
+    'breathlessness': 'difficulty breathing',
+    'trouble breathing': 'difficulty breathing',
+    'MI': 'heart attack',
+    'myocardial infarction': 'heart attack',
+    'cva': 'stroke',
+    'loss of consciousness': 'unconscious',
+    'passed out': 'fainting',
+    'anaphylactic shock': 'anaphylaxis',
+    'high temperature': 'high fever',
+    'haematuria': 'blood in urine',
+    'hematuria': 'blood in urine',
+    'uti': 'infection',
+    'FX': 'fracture',
+    'broken bone': 'fracture',
+    'tiredness': 'fatigue',
+    'stuffy nose': 'runny nose',
+    'dizzy': 'dizziness',
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+def load_dictionary():
+    """
+    Return a predicate telling whether a lowercase token is an ordinary
+    English word, or None if no word list is available.
+    """
+    if DICTIONARY_FILE:
+        with open(DICTIONARY_FILE, 'r', encoding='utf-8') as f:
+            words = frozenset(line.strip().lower() for line in f if line.strip())
+        return words.__contains__
+    try:
+        from wordfreq import zipf_frequency
+    except ImportError:
+        print("No dictionary for typo correction (install wordfreq or set TRIAGE_DICTIONARY_FILE); "
+              "typos will not be corrected", file=sys.stderr)
+        return None
+    return lambda token: zipf_frequency(token, 'en') >= DICTIONARY_MIN_ZIPF
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+def is_dictionary_word(token):
+    """
+    Whether token is an ordinary word that must not be typo-corrected.
+    The word list loads on first use. Without one, every token counts as
+    a word, which turns correction off rather than guessing.
+    """
+    global _dictionary
+    if _dictionary is None:
+        with _dictionary_lock:
+            if _dictionary is None:
+                _dictionary = load_dictionary() or (lambda token: True)
+    return _dictionary(token)
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent
+    transpositions), or limit + 1 once it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class FuzzyIndex:
+    """
+    Symmetric-delete (SymSpell) index over a word vocabulary.
+
+    Every vocabulary word is stored under each string reachable by deleting
+    up to max_distance characters. A query generates its own deletes and
+    only verifies the words found under them, so lookup cost depends on
+    the query's length, not on the vocabulary size. Tokens for which
+    is_word is true are real words and are never corrected.
+    """
+    def __init__(self, vocabulary, max_distance=2, is_word=is_dictionary_word, cache_size=65536):
+        self.vocabulary = frozenset(vocabulary)
+        self.max_distance = max_distance
+        self.is_word = is_word
+        self._deletes = {}
+        for word in self.vocabulary:
+            for variant in self._variants(word, self._allowed_distance(word)):
+                self._deletes.setdefault(variant, []).append(word)
+        # Symptom texts repeat the same everyday words constantly
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _allowed_distance(self, word):
+        # Short words have too many near neighbours to correct safely
+        if len(word) < 4:
+            return 0
+        return 1 if len(word) < 8 else self.max_distance
+
+    @staticmethod
+    def _variants(word, distance):
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def _lookup(self, token):
+        """The closest vocabulary word within the allowed distance, or None."""
+        if token in self.vocabulary:
+            return token
+        # Inflected forms already match the lexicon as typed
+        for suffix in INFLECTION_SUFFIXES:
+            if token.endswith(suffix) and token[:-len(suffix)] in self.vocabulary:
+                return token
+        limit = self._allowed_distance(token)
+        if not limit:
+            return None
+        deletes = self._deletes
+        candidates = {word for variant in self._variants(token, limit) for word in deletes.get(variant, ())}
+        # Checked after the cheap candidate search; most tokens have none
+        if not candidates or self.is_word(token):
+            return None
+        best, best_key = None, None
+        for word in candidates:
+            distance = edit_distance(token, word, limit)
+            # Ties prefer a matching first letter, then alphabetical order
+            key = (distance, word[0] != token[0], word)
+            if distance <= limit and (best_key is None or key < best_key):
+                best, best_key = word, key
+        return best
+
+class SymptomMatcher:
+    """
+    Lexicon lookup that also understands synonyms, abbreviations and typos
+    ("chest pian", "SOB", "hight fever"). Matches report the canonical
+    lexicon phrase, with offsets into the text as given.
+
+    Aliases are compiled into the same Aho-Corasick automaton as the
+    lexicon. Misspelled words (ones that are not dictionary words) are
+    corrected with a FuzzyIndex over the automaton's words before
+    matching. A match may rely on at most one corrected word, and only
+    inside a multi-word phrase whose other words were typed correctly, so
+    a lone look-alike word never becomes a symptom by itself.
+    """
+    def __init__(self, tier_keywords, synonyms=None, max_distance=2, is_word=is_dictionary_word):
+        tier_of = {}
+        for tier, keywords in tier_keywords.items():
+            for keyword in keywords:
+                tier_of.setdefault(' '.join(keyword.lower().split()), tier)
+        surface_forms = {tier: list(keywords) for tier, keywords in tier_keywords.items()}
+        self.canonical = {}
+        self.uppercase_only = set()
+        for alias, phrase in (synonyms or {}).items():
+            written = ' '.join(alias.split())
+            alias, phrase = written.lower(), ' '.join(phrase.lower().split())
+            if phrase not in tier_of:
+                raise ValueError(f"Synonym '{alias}' points at '{phrase}', which is not in the lexicon")
+            if alias not in tier_of:
+                surface_forms[tier_of[phrase]].append(alias)
+                self.canonical[alias] = phrase
+                if written.isupper():
+                    self.uppercase_only.add(alias)
+
+        self.matcher = KeywordMatcher(surface_forms)
+        self.fuzzy = FuzzyIndex({word for phrase in self.matcher.tiers for word in phrase.split()},
+                                max_distance, is_word)
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def _accept(self, match, original):
+        """Apply the abbreviation case rule and map the alias to its phrase."""
+        if match.keyword in self.uppercase_only and not original[match.start:match.end].isupper():
+            return None
+        phrase = self.canonical.get(match.keyword)
+        return match if phrase is None else match._replace(keyword=phrase)
+
+    def find_all(self, text):
+        """Return every lexicon or alias match, typo-corrected, in order of end offset."""
+        original, text = text, text.lower()
+        pieces, corrected_spans = [], []    # spans: (corrected start, end, original start, end)
+        position = length = 0
+        lookup = self.fuzzy.lookup
+        for token_match in TOKEN_PATTERN.finditer(text):
+            token = token_match.group()
+            word = lookup(token)
+            if word is None or word == token:
+                continue
+            start = token_match.start()
+            pieces.append(text[position:start])
+            length += start - position
+            corrected_spans.append((length, length + len(word), start, token_match.end()))
+            pieces.append(word)
+            length += len(word)
+            position = token_match.end()
+
+        if not corrected_spans:
+            matches = (self._accept(match, original) for match in self.matcher.find_all(text))
+            return [match for match in matches if match is not None]
+
+        def to_original(offset):
+            # Match boundaries never fall inside a corrected word
+            shift = 0
+            for corrected_start, corrected_end, original_start, original_end in corrected_spans:
+                if corrected_end <= offset:
+                    shift = original_end - corrected_end
+                elif corrected_start >= offset:
+                    break
+            return offset + shift
+
+        pieces.append(text[position:])
+        corrected_text = ''.join(pieces)
+        matches = []
+        for match in self.matcher.find_all(corrected_text):
+            corrected = sum(1 for start, end, _, _ in corrected_spans if match.start <= start and end <= match.end)
+            if corrected and (corrected > 1 or len(match.keyword.split()) < 2):
+                continue
+            match = self._accept(match._replace(start=to_original(match.start), end=to_original(match.end)),
+                                 original)
+            if match is not None:
+                matches.append(match)
+        return matches
+
+def load_synonyms():
+    """The built-in synonym table, extended by TRIAGE_SYNONYMS_FILE if set."""
+    synonyms = dict(SYMPTOM_SYNONYMS)
+    if SYNONYMS_FILE:
+        with open(SYNONYMS_FILE, 'r', encoding='utf-8') as f:
+            synonyms.update(json.load(f))
+    return synonyms
+
+# Built once at import like KEYWORD_MATCHER; used by TriageClassifier
+SYMPTOM_MATCHER = SymptomMatcher(TIER_KEYWORDS, load_synonyms())
+
+# Strips everything except letters and whitespace before tokenizing
+NON_ALPHA_PATTERN = re.compile(r'[^a-zA-Z\s]')
+
+def download_nltk_data():
+    """Fetch the NLTK corpora used by preprocessing. May hit the network."""
+    import nltk
+    try:
+        nltk.download('stopwords', quiet=True)
+    except Exception as e:
+        print(f"Could not download NLTK data: {e}", file=sys.stderr)
+
+def load_stop_words():
+    """Load the English stopword list once as an immutable set."""
+    from nltk.corpus import stopwords
+    try:
+        return frozenset(stopwords.words('english'))
+    except LookupError:
+        return frozenset()
+
 class TriageClassifier:
-    def __init__(self):
-        self.stemmer = PorterStemmer()
-        try:
-            self.stop_words = set(stopwords.words('english'))
-        except:
-            self.stop_words = set()
+    """
+    Stateless after construction, so a single instance is shared across
+    request threads. The NLTK stemmer and stopword tables are only built
+    the first time preprocessing is requested.
+    """
+    def __init__(self, stop_words=None, stem_cache_size=8192, matcher=None):
+        self.stop_words = None if stop_words is None else frozenset(stop_words)
+        # Anything with find_all(text) -> [KeywordMatch]
+        self.matcher = matcher or (SYMPTOM_MATCHER if FUZZY_MATCHING else KEYWORD_MATCHER)
+        self.stem = None
+        self._stem_cache_size = stem_cache_size
+        self._lock = threading.Lock()
+
+    def load_preprocessing_tables(self):
+        """Build the stemmer and stopword set if that has not happened yet."""
+        if self.stem is not None:
+            return
+        with self._lock:
+            if self.stem is not None:
+                return
+            from nltk.stem import PorterStemmer
+            if self.stop_words is None:
+                self.stop_words = load_stop_words()
+            # lru_cache is thread-safe; symptom vocabularies repeat heavily
+            self.stem = lru_cache(maxsize=self._stem_cache_size)(PorterStemmer().stem)
 
     def preprocess_text(self, text):
         """Clean and preprocess the input text."""
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove special characters and numbers
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-        
-        # Tokenize
-        tokens = word_tokenize(text)
-        
+        self.load_preprocessing_tables()
+
+        # Lowercase and drop special characters and numbers; what remains is
+        # letters and whitespace, so a plain split is a full tokenization
+        tokens = NON_ALPHA_PATTERN.sub('', text.lower()).split()
+
         # Remove stopwords and stem
-        processed_tokens = []
-        for token in tokens:
-            if token not in self.stop_words:
-                stemmed_token = self.stemmer.stem(token)
-                processed_tokens.append(stemmed_token)
-        
-        return ' '.join(processed_tokens)
+        stop_words, stem = self.stop_words, self.stem
+        return ' '.join(stem(token) for token in tokens if token not in stop_words)
 
     def extract_keywords(self, text):
         """Extract medical keywords from text."""
-        text_lower = text.lower()
         found_keywords = []
-        
-        # Check for emergency keywords
-        for keyword in EMERGENCY_KEYWORDS:
-            if keyword in text_lower:
-                found_keywords.append(keyword)
-        
-        # Check for urgent keywords
-        for keyword in URGENT_KEYWORDS:
-            if keyword in text_lower:
-                found_keywords.append(keyword)
-        
-        # Check for routine keywords
-        for keyword in ROUTINE_KEYWORDS:
-            if keyword in text_lower:
-                found_keywords.append(keyword)
-        
-        return list(set(found_keywords))  # Remove duplicates
+        for match in self.matcher.find_all(text):
+            if match.keyword not in found_keywords:
+                found_keywords.append(match.keyword)
+        return found_keywords
 
     def classify_urgency(self, text, keywords):
         """Classify the urgency level based on keywords."""
-        emergency_count = sum(1 for kw in keywords if kw in EMERGENCY_KEYWORDS)
-        urgent_count = sum(1 for kw in keywords if kw in URGENT_KEYWORDS)
-        routine_count = sum(1 for kw in keywords if kw in ROUTINE_KEYWORDS)
+        tiers = [KEYWORD_MATCHER.tiers.get(kw) for kw in keywords]
+        emergency_count = tiers.count('Emergency')
+        urgent_count = tiers.count('Urgent')
+        routine_count = tiers.count('Routine')
         
         if emergency_count > 0:
             confidence = min(0.95, 0.7 + (emergency_count * 0.1))
@@ -112,25 +485,247 @@ class TriageClassifier:
             else:
                 return 'Routine', 0.5
 
-def triage_symptoms(symptoms_text):
-    """Main function to triage symptoms and return classification."""
-    classifier = TriageClassifier()
-    
+# Shared by every request in the process
+classifier = TriageClassifier()
+
+# --- Classifier backends ---
+# Categories from most to least urgent
+CATEGORIES = ('Emergency', 'Urgent', 'Routine')
+
+# 'keyword' (the lexicon rules), 'linear' (hashed n-gram model) or 'transformer'
+CLASSIFIER_BACKEND = os.getenv('TRIAGE_CLASSIFIER', 'keyword')
+LINEAR_MODEL_DIR = os.getenv('TRIAGE_LINEAR_MODEL_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'models', 'triage-linear'))
+# A fine-tuned text-classification checkpoint whose labels are the categories
+TRANSFORMER_MODEL = os.getenv('TRIAGE_TRANSFORMER_MODEL', '')
+
+def hashed_ngrams(text, n_features, ngram=2):
+    """
+    Feature indices for the word n-grams (1..ngram) of text, hashed into
+    n_features buckets. Index 0 is reserved for the bias feature, which
+    every text has. crc32 is used because hash() is randomized per process.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    grams = list(tokens)
+    for n in range(2, ngram + 1):
+        grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    buckets = n_features - 1
+    return [0] + sorted({1 + zlib.crc32(gram.encode('utf-8')) % buckets for gram in grams})
+
+def hashed_feature_batch(texts, n_features, ngram=2):
+    """
+    Sparse binary features for a batch, as flat NumPy arrays: indices,
+    the offset where each text's indices start, and each text's
+    1/sqrt(feature count) scale.
+    """
+    import numpy as np
+    rows = [hashed_ngrams(text, n_features, ngram) for text in texts]
+    counts = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    indices = np.fromiter((index for row in rows for index in row), dtype=np.int64, count=int(counts.sum()))
+    return indices, offsets, 1.0 / np.sqrt(counts)
+
+def escalate_with_keywords(result, keywords):
+    """
+    Lexicon matches can only raise a model's urgency, never lower it, so a
+    learned backend never downgrades an explicit 'chest pain'.
+    """
+    if not keywords:
+        return result
+    keyword_result = classifier.classify_urgency('', keywords)
+    if CATEGORIES.index(keyword_result[0]) < CATEGORIES.index(result[0]):
+        return keyword_result
+    return result
+
+class KeywordBackend:
+    """The lexicon rules in TriageClassifier.classify_urgency."""
+    name = 'keyword'
+
+    def classify_batch(self, texts, keywords_list):
+        return [classifier.classify_urgency(text, keywords) for text, keywords in zip(texts, keywords_list)]
+
+class LinearBackend:
+    """
+    Softmax linear model over hashed word n-grams, evaluated with NumPy.
+
+    A model directory holds weights.npy, an (n_features, classes) float32
+    matrix, and model.json with the classes, bias and hashing settings.
+    The weights are memory-mapped, so gunicorn workers on one host share a
+    single copy through the page cache. Train one with train_classifier.py.
+    """
+    name = 'linear'
+    VERSION = 1
+
+    def __init__(self, weights, bias, classes: Sequence[str], ngram: int = 2):
+        import numpy as np
+        unknown = set(classes) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown classes in linear model: {sorted(unknown)}")
+        self.weights = weights
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.classes = tuple(classes)
+        self.ngram = ngram
+        self.n_features = weights.shape[0]
+
+    @classmethod
+    def load(cls, model_dir: str, mmap: bool = True) -> 'LinearBackend':
+        import numpy as np
+        with open(os.path.join(model_dir, 'model.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported linear model version: {meta.get('version')}")
+        weights = np.load(os.path.join(model_dir, 'weights.npy'), mmap_mode='r' if mmap else None)
+        return cls(weights, meta['bias'], meta['classes'], meta['ngram'])
+
+    def save(self, model_dir: str) -> None:
+        import numpy as np
+        os.makedirs(model_dir, exist_ok=True)
+        np.save(os.path.join(model_dir, 'weights.npy'), np.asarray(self.weights, dtype=np.float32))
+        with open(os.path.join(model_dir, 'model.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'classes': list(self.classes), 'ngram': self.ngram,
+                       'n_features': self.n_features, 'bias': [float(b) for b in self.bias]}, f, indent=2)
+
+    def decision_function(self, texts):
+        """Class scores for a batch: one gather and one segmented sum."""
+        import numpy as np
+        indices, offsets, scale = hashed_feature_batch(texts, self.n_features, self.ngram)
+        scores = np.add.reduceat(self.weights[indices], offsets, axis=0)
+        return scores * scale[:, None].astype(np.float32) + self.bias
+
+    def predict_proba(self, texts):
+        import numpy as np
+        scores = self.decision_function(texts)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def classify_batch(self, texts, keywords_list):
+        if not texts:
+            return []
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            escalate_with_keywords((self.classes[index], float(row[index])), keywords)
+            for row, index, keywords in zip(probabilities, best, keywords_list)
+        ]
+
+class TransformerBackend:
+    """
+    Optional higher-accuracy backend: a fine-tuned transformers
+    text-classification model run on CPU in batches. Needs transformers
+    and torch, and a checkpoint whose labels are the triage categories.
+    """
+    name = 'transformer'
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        from transformers import pipeline
+        self.batch_size = batch_size
+        self._pipeline = pipeline('text-classification', model=model_name, device=-1, truncation=True)
+        labels = self._pipeline.model.config.id2label.values()
+        self._labels = {label: label.capitalize() for label in labels}
+        unknown = set(self._labels.values()) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Transformer labels are not triage categories: {sorted(unknown)}")
+
+    def classify_batch(self, texts, keywords_list):
+        if not texts:
+            return []
+        outputs = self._pipeline(list(texts), batch_size=self.batch_size)
+        return [
+            escalate_with_keywords((self._labels[output['label']], float(output['score'])), keywords)
+            for output, keywords in zip(outputs, keywords_list)
+        ]
+
+def create_backend(name: str = CLASSIFIER_BACKEND):
+    """
+    Build the named backend. A learned backend that cannot be loaded
+    falls back to the keyword rules, so a missing model file never takes
+    triage down.
+    """
+    if name == 'keyword':
+        return KeywordBackend()
+    try:
+        if name == 'linear':
+            return LinearBackend.load(LINEAR_MODEL_DIR)
+        if name == 'transformer':
+            if not TRANSFORMER_MODEL:
+                raise ValueError("TRIAGE_TRANSFORMER_MODEL is not set")
+            return TransformerBackend(TRANSFORMER_MODEL)
+        raise ValueError("unknown backend; expected keyword, linear or transformer")
+    except Exception as e:
+        print(f"Could not load the '{name}' classifier, using keyword rules: {e}", file=sys.stderr)
+        return KeywordBackend()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_classifier_backend():
+    """Return the process-wide backend, loading it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def configure_classifier_backend(backend) -> None:
+    """Swap the classifier backend at runtime (None reloads the configured one)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def _build_result(category, confidence, keywords, symptoms_text, preprocess):
+    result = {
+        'category': category,
+        'confidence': confidence,
+        'keywords': keywords
+    }
+    if preprocess:
+        result['processed_text'] = classifier.preprocess_text(symptoms_text)
+    return result
+
+def triage_symptoms(symptoms_text, preprocess=False):
+    """
+    Main function to triage symptoms and return classification.
+    Stemmed 'processed_text' is only computed when preprocess is True.
+    """
     # Extract keywords
     keywords = classifier.extract_keywords(symptoms_text)
     
     # Classify urgency
-    category, confidence = classifier.classify_urgency(symptoms_text, keywords)
-    
-    return {
-        'category': category,
-        'confidence': confidence,
-        'keywords': keywords,
-        'processed_text': classifier.preprocess_text(symptoms_text)
+    [(category, confidence)] = get_classifier_backend().classify_batch([symptoms_text], [keywords])
+    return _build_result(category, confidence, keywords, symptoms_text, preprocess)
+
+def triage_symptoms_batch(symptoms_texts, preprocess=False):
+    """
+    Triage many texts in one pass, classifying each distinct text once.
+    Learned backends score the whole batch in one vectorized call.
+    Returns results in the same order as the input.
+    """
+    unique_texts = list(dict.fromkeys(symptoms_texts))
+    keywords_list = [classifier.extract_keywords(text) for text in unique_texts]
+    classified = get_classifier_backend().classify_batch(unique_texts, keywords_list)
+    unique_results = {
+        text: _build_result(category, confidence, keywords, text, preprocess)
+        for text, keywords, (category, confidence) in zip(unique_texts, keywords_list, classified)
     }
+    return [unique_results[text] for text in symptoms_texts]
+
+def warm_up(download=False):
+    """
+    Optional hook to pay NLTK initialization and classifier loading before
+    the first request, e.g. from a gunicorn post_worker_init hook.
+    """
+    if download:
+        download_nltk_data()
+    classifier.load_preprocessing_tables()
+    if FUZZY_MATCHING:
+        is_dictionary_word('warm')
+    get_classifier_backend()
 
 # Test function
 if __name__ == "__main__":
     test_symptoms = "I have severe chest pain and difficulty breathing"
-    result = triage_symptoms(test_symptoms)
+    result = triage_symptoms(test_symptoms, preprocess=True)
     print(f"Triage Result: {result}")
@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Iterator, Optional
+
+# Tiers in admission order, most urgent first
+TIERS = ('Emergency', 'Urgent', 'Routine')
+
+
+def _tier_setting(name: str, tier: str, default: float) -> float:
+    return float(os.getenv(f'TRIAGE_SCHED_{name}_{tier.upper()}', default))
+
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class PriorityScheduler:
+    """
+    Admission control for the expensive explanation step.
+
+    Each tier has its own concurrency limit, and all tiers share a total
+    limit. When a slot frees up, the most urgent waiting request that fits
+    gets it, so Emergency never queues behind Routine. A request is shed
+    (told to use the fallback) if its tier's queue is full or it waits
+    longer than its tier's max_wait. Routine has the shortest queue and
+    wait, so it is shed first.
+    """
+    def __init__(self, total_limit: int, limits: Dict[str, int], max_queue: Dict[str, int],
+                 max_wait: Dict[str, float]):
+        self.total_limit = total_limit
+        self.limits = dict(limits)
+        self.max_queue = dict(max_queue)
+        self.max_wait = dict(max_wait)
+        self._cond = threading.Condition()
+        self._waiting = []                  # sorted (priority, seq) tickets
+        self._async_waiters = {}            # ticket -> (loop, future) for acquire_async
+        self._seq = itertools.count()
+        self._active = {tier: 0 for tier in TIERS}
+        self._queued = {tier: 0 for tier in TIERS}
+        self._counters = {tier: {'admitted': 0, 'shed': 0, 'max_queue_depth': 0, 'wait_seconds': 0.0}
+                          for tier in TIERS}
+
+    @classmethod
+    def from_env(cls, total_limit: Optional[int] = None) -> 'PriorityScheduler':
+        total = total_limit or int(os.getenv('TRIAGE_SCHED_TOTAL_LIMIT', '16'))
+        defaults = {
+            # limit, max queue, max wait in seconds
+            'Emergency': (total, 1000, 10.0),
+            'Urgent': (max(1, total * 3 // 4), 64, 5.0),
+            'Routine': (max(1, total // 2), 32, 2.0),
+        }
+        return cls(
+            total_limit=total,
+            limits={t: int(_tier_setting('LIMIT', t, d[0])) for t, d in defaults.items()},
+            max_queue={t: int(_tier_setting('QUEUE', t, d[1])) for t, d in defaults.items()},
+            max_wait={t: _tier_setting('WAIT', t, d[2]) for t, d in defaults.items()},
+        )
+
+    def _tier(self, category: str) -> str:
+        return category if category in self._active else 'Routine'
+
+    def _has_capacity(self, tier: str) -> bool:
+        return (self._active[tier] < self.limits[tier]
+                and sum(self._active.values()) < self.total_limit)
+
+    def _next_eligible(self):
+        for ticket in self._waiting:
+            if self._has_capacity(TIERS[ticket[0]]):
+                return ticket
+        return None
+
+    def _notify(self) -> None:
+        """
+        Wake waiters after a slot frees up or the queue changes. Call with
+        _cond held. Thread waiters re-check on the condition; an async
+        waiter is woken through its own loop only when it is next in line.
+        """
+        self._cond.notify_all()
+        ticket = self._next_eligible()
+        waiter = self._async_waiters.get(ticket) if ticket is not None else None
+        if waiter is not None:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _enqueue(self, tier: str):
+        """Queue a ticket for tier, or return None if its queue is full (shed). Call with _cond held."""
+        if self._queued[tier] >= self.max_queue[tier]:
+            self._counters[tier]['shed'] += 1
+            return None
+        ticket = (TIERS.index(tier), next(self._seq))
+        bisect.insort(self._waiting, ticket)
+        self._queued[tier] += 1
+        counters = self._counters[tier]
+        counters['max_queue_depth'] = max(counters['max_queue_depth'], self._queued[tier])
+        return ticket
+
+    def _dequeue(self, tier: str, ticket) -> None:
+        self._waiting.remove(ticket)
+        self._queued[tier] -= 1
+        # Our departure may make the next waiter eligible
+        self._notify()
+
+    def _admit(self, tier: str, waited: float) -> None:
+        self._active[tier] += 1
+        self._counters[tier]['admitted'] += 1
+        self._counters[tier]['wait_seconds'] += waited
+
+    def try_acquire(self, category: str) -> bool:
+        """Take a slot without waiting, if one is free and nobody more urgent is queued for it."""
+        tier = self._tier(category)
+        with self._cond:
+            if self._has_capacity(tier) and self._next_eligible() is None:
+                self._admit(tier, 0.0)
+                return True
+            return False
+
+    def acquire(self, category: str) -> bool:
+        """
+        Wait for a slot in priority order. Returns False if the request is
+        shed; release() must only be called after a True result.
+        """
+        tier = self._tier(category)
+        start = time.monotonic()
+        deadline = start + self.max_wait[tier]
+        with self._cond:
+            if self._has_capacity(tier) and self._next_eligible() is None:
+                self._admit(tier, 0.0)
+                return True
+            ticket = self._enqueue(tier)
+            if ticket is None:
+                return False
+            try:
+                while self._next_eligible() != ticket:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters[tier]['shed'] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self._admit(tier, time.monotonic() - start)
+                return True
+            finally:
+                self._dequeue(tier, ticket)
+
+    async def acquire_async(self, category: str) -> bool:
+        """
+        Coroutine version of acquire(). The waiter sits in the same priority
+        queue as thread waiters and is woken by a future resolved from
+        release(), so it never occupies an executor thread. Cancelling it
+        while queued gives up its place without taking a slot.
+        """
+        tier = self._tier(category)
+        start = time.monotonic()
+        deadline = start + self.max_wait[tier]
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._has_capacity(tier) and self._next_eligible() is None:
+                self._admit(tier, 0.0)
+                return True
+            ticket = self._enqueue(tier)
+            if ticket is None:
+                return False
+        try:
+            while True:
+                with self._cond:
+                    if self._next_eligible() == ticket:
+                        # No await between admitting and returning, so a
+                        # cancellation cannot strand the slot
+                        self._admit(tier, time.monotonic() - start)
+                        return True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters[tier]['shed'] += 1
+                        return False
+                    future = loop.create_future()
+                    self._async_waiters[ticket] = (loop, future)
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        self._async_waiters.pop(ticket, None)
+        finally:
+            with self._cond:
+                self._dequeue(tier, ticket)
+
+    def release(self, category: str) -> None:
+        tier = self._tier(category)
+        with self._cond:
+            self._active[tier] -= 1
+            self._notify()
+
+    @contextmanager
+    def slot(self, category: str) -> Iterator[bool]:
+        """Context manager around acquire/release yielding whether the request was admitted."""
+        admitted = self.acquire(category)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release(category)
+
+    @asynccontextmanager
+    async def slot_async(self, category: str):
+        """Async slot(), waiting with acquire_async."""
+        admitted = await self.acquire_async(category)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release(category)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'total_limit': self.total_limit,
+                'in_flight': sum(self._active.values()),
+                'tiers': {
+                    tier: dict(self._counters[tier], in_flight=self._active[tier], queued=self._queued[tier],
+                               limit=self.limits[tier], max_queue=self.max_queue[tier],
+                               max_wait=self.max_wait[tier])
+                    for tier in TIERS
+                },
+            }
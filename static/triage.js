@@ -92,7 +92,9 @@ async function handleTriageSubmission(e) {
     showLoading();
 
     try {
-        const response = await fetch('/triage', {
+        // Streaming endpoint: the triage category arrives first, the
+        // detailed explanation follows once the AI model has answered
+        const response = await fetch('/triage/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -104,9 +106,33 @@ async function handleTriageSubmission(e) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const result = await response.json();
-        hideLoading();
-        displayTriageResults(result);
+        let result = null;
+        await readTriageStream(response, function(event) {
+            if (event.event === 'triage') {
+                result = {
+                    triage_category: event.triage_category,
+                    confidence: event.confidence,
+                    keywords: event.keywords,
+                    explanation_pending: true
+                };
+                hideLoading();
+                displayTriageResults(result);
+            } else if (event.event === 'explanation' && result) {
+                result.explanation_details = event.explanation_details;
+                result.explanation_pending = false;
+                displayTriageResults(result, false);
+            } else if (event.event === 'error') {
+                throw new Error(event.error);
+            }
+        });
+
+        if (!result) {
+            throw new Error('No triage result received');
+        }
+        if (result.explanation_pending) {
+            result.explanation_pending = false;
+            displayTriageResults(result, false);
+        }
         
     } catch (error) {
         hideLoading();
@@ -115,6 +141,40 @@ async function handleTriageSubmission(e) {
     }
 }
 
+// Reads an NDJSON response, calling onEvent for each line as it arrives
+async function readTriageStream(response, onEvent) {
+    if (!response.body || !response.body.getReader) {
+        // No streaming support: handle all events once the body is complete
+        const text = await response.text();
+        text.split('\n').filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let newlineIndex;
+        while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newlineIndex).trim();
+            buffer = buffer.slice(newlineIndex + 1);
+            if (line) {
+                onEvent(JSON.parse(line));
+            }
+        }
+    }
+
+    buffer += decoder.decode();
+    if (buffer.trim()) {
+        onEvent(JSON.parse(buffer));
+    }
+}
+
 function validateTriageData(data) {
     if (!data.symptoms || data.symptoms.length < 10) {
         alert('Please provide more detailed symptoms.');
@@ -144,7 +204,7 @@ function validateTriageData(data) {
     return true;
 }
 
-function displayTriageResults(result) {
+function displayTriageResults(result, scrollToResults = true) {
     const resultsContainer = document.getElementById('triageResults');
     const resultsContent = resultsContainer.querySelector('.results-content');
     
@@ -159,6 +219,16 @@ function displayTriageResults(result) {
         </div>
     `;
 
+    // Placeholder while the detailed explanation is still streaming in
+    if (result.explanation_pending) {
+        resultsHTML += `
+            <div class="result-section">
+                <h3><i class="fa-solid fa-spinner fa-spin"></i> Preparing Detailed Assessment</h3>
+                <p>Your triage category is ready. A detailed explanation is being generated...</p>
+            </div>
+        `;
+    }
+
     // Display explanation details if available
     if (result.explanation_details) {
         const details = result.explanation_details;
@@ -258,7 +328,9 @@ function displayTriageResults(result) {
 
     resultsContent.innerHTML = resultsHTML;
     resultsContainer.classList.remove('hidden');
-    resultsContainer.scrollIntoView({ behavior: 'smooth' });
+    if (scrollToResults) {
+        resultsContainer.scrollIntoView({ behavior: 'smooth' });
+    }
 }
 
 function getUrgencyColor(category) {
@@ -0,0 +1,126 @@
+"""
+Train the hashed n-gram linear classifier used by nlp.LinearBackend
+(TRIAGE_CLASSIFIER=linear) from a JSONL file of labelled records.
+
+    python train_classifier.py labelled.jsonl -o models/triage-linear
+    python train_classifier.py labelled.jsonl --text-field note --label-field triage --holdout 0.2
+
+Each record needs the symptom text and a category label (Emergency,
+Urgent or Routine). Training is mini-batch AdaGrad on the softmax loss,
+in NumPy only. The weights are written as weights.npy so workers can
+memory-map them.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import nlp
+
+
+def load_examples(path, text_field, label_field):
+    texts, labels, skipped = [], [], 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text, label = record.get(text_field), record.get(label_field)
+            if not isinstance(text, str) or label not in nlp.CATEGORIES:
+                skipped += 1
+                continue
+            texts.append(text)
+            labels.append(nlp.CATEGORIES.index(label))
+    if skipped:
+        print(f"Skipped {skipped} records without text or a known label", file=sys.stderr)
+    return texts, np.array(labels, dtype=np.int64)
+
+
+def train(texts, labels, n_features, ngram, epochs, batch_size, learning_rate, l2, seed):
+    """Return (weights, bias) fitted with mini-batch AdaGrad."""
+    rng = np.random.default_rng(seed)
+    n_classes = len(nlp.CATEGORIES)
+    weights = np.zeros((n_features, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes, dtype=np.float32)
+    weight_sq = np.full_like(weights, 1e-8)
+    bias_sq = np.full_like(bias, 1e-8)
+    # Featurize once; batches slice the flat arrays
+    indices, offsets, scale = nlp.hashed_feature_batch(texts, n_features, ngram)
+    ends = np.append(offsets[1:], len(indices))
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(texts))
+        loss = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            batch_indices = np.concatenate([indices[offsets[i]:ends[i]] for i in batch])
+            counts = ends[batch] - offsets[batch]
+            batch_offsets = np.zeros(len(batch), dtype=np.int64)
+            np.cumsum(counts[:-1], out=batch_offsets[1:])
+
+            scores = np.add.reduceat(weights[batch_indices], batch_offsets, axis=0) * scale[batch, None] + bias
+            scores -= scores.max(axis=1, keepdims=True)
+            probabilities = np.exp(scores)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            loss -= np.log(probabilities[np.arange(len(batch)), labels[batch]] + 1e-12).sum()
+
+            error = probabilities
+            error[np.arange(len(batch)), labels[batch]] -= 1.0
+            error /= len(batch)
+            # Each feature occurrence receives its text's error, scaled
+            rows = np.repeat(error * scale[batch, None], counts, axis=0)
+            touched, inverse = np.unique(batch_indices, return_inverse=True)
+            grad = np.zeros((len(touched), n_classes), dtype=np.float64)
+            np.add.at(grad, inverse, rows)
+            grad += l2 * weights[touched]
+
+            weight_sq[touched] += grad ** 2
+            weights[touched] -= learning_rate * grad / np.sqrt(weight_sq[touched])
+            bias_grad = error.sum(axis=0)
+            bias_sq += bias_grad ** 2
+            bias -= learning_rate * bias_grad / np.sqrt(bias_sq)
+        print(f"epoch {epoch + 1}: loss {loss / len(texts):.4f}", file=sys.stderr)
+    return weights, bias
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the linear triage classifier.")
+    parser.add_argument('input', help="JSONL file of labelled records")
+    parser.add_argument('-o', '--output', default=nlp.LINEAR_MODEL_DIR, help="model directory to write")
+    parser.add_argument('--text-field', default='symptoms')
+    parser.add_argument('--label-field', default='category')
+    parser.add_argument('--features', type=int, default=2 ** 18, help="hash buckets (rows in weights.npy)")
+    parser.add_argument('--ngram', type=int, default=2, help="longest word n-gram used as a feature")
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=0.5)
+    parser.add_argument('--l2', type=float, default=1e-6)
+    parser.add_argument('--holdout', type=float, default=0.1, help="fraction held out for the accuracy report")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    texts, labels = load_examples(args.input, args.text_field, args.label_field)
+    if not texts:
+        raise SystemExit("No usable training records")
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    n_holdout = int(len(texts) * args.holdout)
+    held, fit = order[:n_holdout], order[n_holdout:]
+
+    start = time.perf_counter()
+    weights, bias = train([texts[i] for i in fit], labels[fit], args.features, args.ngram,
+                          args.epochs, args.batch_size, args.learning_rate, args.l2, args.seed)
+    model = nlp.LinearBackend(weights, bias, nlp.CATEGORIES, args.ngram)
+    model.save(args.output)
+
+    report = {"records": len(texts), "trained_on": len(fit), "seconds": round(time.perf_counter() - start, 2),
+              "output": args.output}
+    if n_holdout:
+        predicted = model.predict_proba([texts[i] for i in held]).argmax(axis=1)
+        report["holdout_accuracy"] = round(float((predicted == labels[held]).mean()), 4)
+    print(json.dumps(report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline bulk triage: stream a JSONL/NDJSON file of records through
+nlp.triage_symptoms on every core and write one result line per record.
+
+    python triage_cli.py intake.jsonl -o triaged.jsonl --explain skip
+    python triage_cli.py intake.jsonl -o triaged.jsonl --checkpoint run.ckpt --resume
+
+Input is read and output written incrementally in fixed-size chunks, so
+memory use does not depend on file size. Results keep input order. With
+--checkpoint, progress is saved after every written chunk. --resume
+continues from the last checkpoint.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import nlp
+
+EXPLAIN_MODES = ('skip', 'stub', 'gemini')
+
+
+def record_profile(record):
+    """Build the Gemini user profile from whatever fields a record has."""
+    bmi = record.get('bmi')
+    if bmi is None:
+        try:
+            height_m = float(record.get('height')) / 100
+            bmi = round(float(record.get('weight')) / (height_m * height_m), 1)
+        except (TypeError, ValueError, ZeroDivisionError):
+            bmi = 'Unknown'
+    return {
+        "age": record.get('age', 'Unknown'),
+        "gender": record.get('gender', 'Unknown'),
+        "bmi": bmi,
+        "history": list(record.get('history') or []),
+    }
+
+
+def triage_line(index, raw, text_field, id_field, explain):
+    """Triage one input line, returning its output dict."""
+    result = {"index": index}
+    try:
+        record = json.loads(raw)
+    except ValueError as e:
+        result["error"] = f"Invalid JSON: {e}"
+        return result
+    if not isinstance(record, dict):
+        result["error"] = "Record is not a JSON object."
+        return result
+    if id_field in record:
+        result[id_field] = record[id_field]
+
+    text = record.get(text_field)
+    if not isinstance(text, str) or not text.strip():
+        result["error"] = f"Missing '{text_field}' text."
+        return result
+
+    triage_result = nlp.triage_symptoms(text)
+    result["triage_category"] = triage_result['category']
+    result["confidence"] = round(triage_result['confidence'], 2)
+    result["keywords"] = triage_result['keywords']
+
+    if explain == 'stub':
+        import gemini
+        result["explanation_details"] = gemini.get_fallback_response(triage_result['category'], text)
+    elif explain == 'gemini':
+        import gemini
+        result["explanation_details"] = gemini.generate_structured_explanation(
+            record_profile(record), text, triage_result['category'], triage_result['keywords']
+        )
+    return result
+
+
+def init_worker():
+    """Send anything printed in a worker to stderr, so it never mixes into NDJSON written to stdout."""
+    sys.stdout = sys.stderr
+
+
+def triage_chunk(chunk, text_field, id_field, explain):
+    """Worker entry point: triage a chunk of (index, raw line) pairs and serialize the results."""
+    return b''.join(
+        json.dumps(triage_line(index, raw, text_field, id_field, explain)).encode('utf-8') + b'\n'
+        for index, raw in chunk
+    )
+
+
+def read_chunks(stream, chunk_size, start_index):
+    """Yield (chunk, bytes_consumed) for non-blank lines, chunk_size lines at a time."""
+    chunk, consumed, index = [], 0, start_index
+    for raw in stream:
+        consumed += len(raw)
+        if raw.strip():
+            chunk.append((index, raw))
+            index += 1
+        if len(chunk) >= chunk_size:
+            yield chunk, consumed
+            chunk, consumed = [], 0
+    if chunk or consumed:
+        yield chunk, consumed
+
+
+def load_checkpoint(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def run(args):
+    workers = args.workers or os.cpu_count() or 1
+    state = {"input_offset": 0, "output_bytes": 0, "records": 0}
+    if args.resume:
+        if args.input == '-' or not args.checkpoint:
+            raise SystemExit("--resume needs a seekable input file and --checkpoint")
+        if os.path.exists(args.checkpoint):
+            state = load_checkpoint(args.checkpoint)
+
+    in_stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    if state["input_offset"]:
+        in_stream.seek(state["input_offset"])
+
+    if args.output == '-':
+        out_stream = sys.stdout.buffer
+    elif state["output_bytes"]:
+        # Drop anything written after the last checkpoint
+        out_stream = open(args.output, 'r+b')
+        out_stream.truncate(state["output_bytes"])
+        out_stream.seek(state["output_bytes"])
+    else:
+        out_stream = open(args.output, 'wb')
+
+    start = time.perf_counter()
+    processed = 0
+    last_report = start
+    pending = deque()
+
+    def drain_one():
+        nonlocal processed, last_report
+        future, consumed, count = pending.popleft()
+        data = future.result()
+        out_stream.write(data)
+        out_stream.flush()
+        state["input_offset"] += consumed
+        state["output_bytes"] += len(data)
+        state["records"] += count
+        processed += count
+        if args.checkpoint:
+            save_checkpoint(args.checkpoint, state)
+        now = time.perf_counter()
+        if args.progress and now - last_report >= args.progress:
+            rate = processed / (now - start)
+            print(f"{state['records']} records, {rate:.0f} records/s", file=sys.stderr)
+            last_report = now
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for chunk, consumed in read_chunks(in_stream, args.chunk_size, state["records"]):
+                pending.append((
+                    pool.submit(triage_chunk, chunk, args.text_field, args.id_field, args.explain),
+                    consumed, len(chunk)
+                ))
+                # Bound the chunks held in memory
+                while len(pending) >= workers * 2:
+                    drain_one()
+            while pending:
+                drain_one()
+    finally:
+        if in_stream is not sys.stdin.buffer:
+            in_stream.close()
+        if out_stream is not sys.stdout.buffer:
+            out_stream.close()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed else 0.0
+    report = {
+        "records": processed,
+        "total_records": state["records"],
+        "seconds": round(elapsed, 3),
+        "workers": workers,
+        "records_per_sec": round(rate, 1),
+        "records_per_sec_per_core": round(rate / workers, 1),
+    }
+    print(json.dumps(report), file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-triage a JSONL file of patient records.")
+    parser.add_argument('input', help="input JSONL/NDJSON file, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output NDJSON file (default: stdout)")
+    parser.add_argument('--text-field', default='symptoms', help="record field holding the symptom text")
+    parser.add_argument('--id-field', default='id', help="record field copied to the output when present")
+    parser.add_argument('--explain', choices=EXPLAIN_MODES, default='skip',
+                        help="skip: category only; stub: add the static fallback explanation; "
+                             "gemini: call the model for every record")
+    parser.add_argument('-j', '--workers', type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="records per worker task")
+    parser.add_argument('--checkpoint', help="file to record progress in after every chunk")
+    parser.add_argument('--resume', action='store_true', help="continue from --checkpoint")
+    parser.add_argument('--progress', type=float, default=0, help="print progress every N seconds")
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()